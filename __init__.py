@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from . import cli
 from . import controllers
-from . import models
\ No newline at end of file
+from . import models
+from .hooks import post_init_hook
@@ -7,10 +7,13 @@
     "depends": ["base", "hr", "website", "hr_holidays" ],
     "data": [
         "security/ir.model.access.csv",
+        "data/ir_cron_data.xml",
         "views/register_template.xml",
         "views/employee_profile_template.xml",
         "views/leave_request_form_template.xml",
-        "views/hr_leave_tree.xml"
+        "views/hr_leave_tree.xml",
+        "views/hr_employee_actions.xml",
+        "views/hr_leave_notification_job_views.xml"
     ],
     'assets': {
         'web.assets_frontend': [
@@ -21,6 +24,7 @@
             'custom_leave_request/static/src/js/leave_request.js',
         ],
     },
+    "post_init_hook": "post_init_hook",
     "application": True,
     "installable": True,
     "license": "LGPL-3",
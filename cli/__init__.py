@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import leave_import
+from . import leave_index_bench
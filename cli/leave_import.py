@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+
+import odoo
+from odoo import SUPERUSER_ID, api
+from odoo.cli import Command
+from odoo.tools import config
+
+
+class LeaveImport(Command):
+    """Bulk import of leaves from a CSV or JSON lines file"""
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(
+            prog="%s leaveimport" % sys.argv[0].split(os.path.sep)[-1],
+            description=self.__doc__,
+            epilog="Other options are passed to the server configuration (-c, -d, --db_host, ...).",
+        )
+        parser.add_argument('file', help="CSV (with header) or .jsonl file")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="defaults to the file extension")
+        parser.add_argument('--dry-run', action='store_true', help="validate only, nothing is created")
+        parser.add_argument('--batch-size', type=int, default=500)
+        args, server_args = parser.parse_known_args(cmdargs)
+
+        config.parse_config(server_args)
+        dbname = config['db_name']
+        if not dbname:
+            sys.exit("A database is required (-d)")
+        file_format = args.format or ('jsonl' if args.file.endswith(('.jsonl', '.json')) else 'csv')
+        with open(args.file, 'rb') as f:
+            content = f.read()
+
+        def progress(done, total):
+            print("%s/%s rows" % (done, total), file=sys.stderr)
+
+        registry = odoo.registry(dbname)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            report = env['hr.leave.import']._import_leaves(
+                content, file_format, dry_run=args.dry_run, batch_size=args.batch_size, progress=progress)
+
+        for error in report['errors']:
+            print("line %s: %s" % (error['line'], error['error']))
+        print("%s rows, %s valid, %s created%s" % (
+            report['rows'], report['valid'], report['created'], " (dry run)" if report['dry_run'] else ""))
@@ -0,0 +1,146 @@
+import argparse
+import os
+import sys
+from datetime import date
+
+import odoo
+from odoo import SUPERUSER_ID, api
+from odoo.cli import Command
+from odoo.tools import config
+from odoo.tools.sql import table_exists
+
+from ..hooks import LEAVE_INDEXES, LEAVE_RANGE_INDEX, create_leave_indexes, create_leave_range_index
+from ..models.hr_leave import RANGE_CONFLICTS_QUERY, TRACKER_DELTA_QUERY
+from ..models.leave_balance import LEAVE_SUMS_QUERY
+
+# Leaves of each seeded employee start SEED_SPACING days apart from SEED_START
+SEED_START = date(2015, 1, 1)
+SEED_SPACING = 3
+
+
+class LeaveIndexBench(Command):
+    """EXPLAIN the portal leave queries on seeded leaves, with and without the module indexes.
+
+    Seeds employees and leaves in the database, prints ``EXPLAIN (ANALYZE,
+    BUFFERS)`` of the overlap check, balance aggregate and tracker update
+    statements of the models, drops the indexes of hooks.py and prints them
+    again. Everything is rolled back at the end unless ``--keep`` is given.
+    The tracker table is not seeded, its update is explained on the rows it
+    already has.
+    """
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(
+            prog="%s leaveindexbench" % sys.argv[0].split(os.path.sep)[-1],
+            description=self.__doc__,
+            epilog="Other options are passed to the server configuration (-c, -d, --db_host, ...).",
+        )
+        parser.add_argument('--rows', type=int, default=1000000, help="leaves to seed (default 1000000)")
+        parser.add_argument('--employees', type=int, default=2000, help="employees to spread them over")
+        parser.add_argument('--keep', action='store_true', help="commit the seeded data instead of rolling back")
+        args, server_args = parser.parse_known_args(cmdargs)
+
+        config.parse_config(server_args)
+        dbname = config['db_name']
+        if not dbname:
+            sys.exit("A database is required (-d)")
+
+        registry = odoo.registry(dbname)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            employees, type_ids = self._seed(env, args.rows, args.employees)
+            create_leave_indexes(cr)
+            create_leave_range_index(cr)
+            cr.execute("ANALYZE hr_leave")
+
+            self._explain_all(env, employees, type_ids, "with indexes")
+            cr.execute("SAVEPOINT leave_index_bench")
+            for name, table, _columns, _where in LEAVE_INDEXES:
+                if table in ('hr_leave', 'hr_leave_tracker'):
+                    cr.execute('DROP INDEX IF EXISTS "%s"' % name)
+            cr.execute('DROP INDEX IF EXISTS "%s"' % LEAVE_RANGE_INDEX)
+            self._explain_all(env, employees, type_ids, "without indexes")
+            cr.execute("ROLLBACK TO SAVEPOINT leave_index_bench")
+
+            if args.keep:
+                cr.commit()
+            else:
+                cr.rollback()
+
+    def _seed(self, env, rows, employee_count):
+        """Create ``employee_count`` employees and ``rows`` leaves spread over them with one INSERT"""
+        Employee = env['hr.employee'].with_context(tracking_disable=True)
+        vals_list = [{'name': 'Benchmark Employee %s' % index} for index in range(employee_count)]
+        if 'employee_number' in Employee._fields:
+            for index, vals in enumerate(vals_list):
+                vals['employee_number'] = 'BENCH%06d' % index
+        employees = Employee.create(vals_list)
+        type_ids = env['hr.leave.type'].with_context(active_test=False).search([]).ids
+        if not type_ids:
+            sys.exit("At least one leave type is required")
+
+        print("Seeding %s leaves for %s employees..." % (rows, employee_count), file=sys.stderr)
+        env.cr.execute("""
+            INSERT INTO hr_leave (name, employee_id, holiday_status_id, holiday_type, state, active,
+                                  request_date_from, request_date_to, date_from, date_to, number_of_days,
+                                  create_uid, write_uid, create_date, write_date)
+            SELECT 'Benchmark leave', s.employee_id, s.type_id, 'employee', s.state, true,
+                   s.date_from, s.date_from + s.length, s.date_from::timestamp, (s.date_from + s.length)::timestamp + interval '23 hours',
+                   s.length + 1, %(uid)s, %(uid)s, now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+              FROM (
+                SELECT (%(employee_ids)s::int[])[1 + g %% %(employee_count)s] AS employee_id,
+                       (%(type_ids)s::int[])[1 + (g / %(employee_count)s) %% %(type_count)s] AS type_id,
+                       (ARRAY['validate', 'validate', 'confirm', 'refuse'])[1 + g %% 4] AS state,
+                       %(start)s::date + (g / %(employee_count)s) * %(spacing)s AS date_from,
+                       g %% 2 AS length
+                  FROM generate_series(0, %(rows)s - 1) AS g
+              ) AS s
+        """, {
+            'uid': env.uid,
+            'employee_ids': employees.ids,
+            'employee_count': len(employees),
+            'type_ids': type_ids,
+            'type_count': len(type_ids),
+            'start': SEED_START,
+            'spacing': SEED_SPACING,
+            'rows': rows,
+        })
+        return employees, type_ids
+
+    def _explain_all(self, env, employees, type_ids, label):
+        employee = employees[len(employees) // 2]
+        today = date.today()
+        year_start = date(today.year, 1, 1)
+        self._explain(env.cr, "check_leave_valid overlap check, %s" % label, RANGE_CONFLICTS_QUERY, {
+            'employee_id': employee.id,
+            'date_from': SEED_START.replace(year=SEED_START.year + 1),
+            'date_to': SEED_START.replace(year=SEED_START.year + 1, day=5),
+            'states': ('validate',),
+            'exclude_ids': [],
+        })
+        self._explain(env.cr, "balance aggregate (50 employees), %s" % label, LEAVE_SUMS_QUERY, {
+            'employee_ids': employees[:50].ids,
+            'accrual_starts': [year_start] * len(employees[:50]),
+            'year_start': year_start,
+            'year_end': date(today.year, 12, 31),
+            'system_start': year_start,
+            'after_start': year_start,
+            'type_ids': type_ids,
+        })
+        if table_exists(env.cr, 'hr_leave_tracker'):
+            # A zero delta: the UPDATE is explained without changing the tracker
+            self._explain(env.cr, "tracker update, %s" % label, TRACKER_DELTA_QUERY.format(table='hr_leave_tracker'), {
+                'taken': 0.0,
+                'pending': 0.0,
+                'uid': env.uid,
+                'employee_id': employee.id,
+                'leave_type': 'Annual Leave',
+                'year': str(today.year),
+            })
+
+    def _explain(self, cr, title, query, params):
+        cr.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+        print("== %s" % title)
+        for (line,) in cr.fetchall():
+            print(line)
+        print()
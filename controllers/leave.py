@@ -1,5 +1,5 @@
 import logging
-from odoo import http, fields
+from odoo import http, fields, _
 from odoo.http import request, Response
 from datetime import datetime, timedelta
 import json
@@ -7,36 +7,71 @@ import base64
 from datetime import datetime
 from datetime import date
 from dateutil.relativedelta import relativedelta
+from werkzeug.urls import url_encode
 from werkzeug.utils import secure_filename
 from calendar import monthrange
 import calendar
 
+import psycopg2
+
+from odoo.exceptions import UserError
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+
+from ..models.hr_leave import TAKEN_DAY_CODES
+from ..models.leave_attachment_upload import ATTACHMENT_MAX_SIZE, check_attachment_limits
+from ..models.leave_request_idempotency import IDEMPOTENCY_KEY_MAX_LENGTH
+from .portal_session import build_employee_context, get_portal_employee, get_portal_employee_context
+
 _logger = logging.getLogger(__name__)
 
+# Largest page served by /api/leave-balance/batch
+BATCH_BALANCE_MAX_LIMIT = 500
+
+# Window of /api/leave/taken-days: the current and next 12 months by default
+TAKEN_DAYS_DEFAULT_MONTHS = 13
+TAKEN_DAYS_MAX_MONTHS = 24
+
+# Years served per /api/leave/working-calendar call
+WORKING_CALENDAR_MAX_YEARS = 3
+
+# Leave history: states shown in the portal and years offered by the filter
+LEAVE_STATE_LABELS = {'confirm': 'Pending', 'validate': 'Approved', 'refuse': 'Rejected'}
+HISTORY_YEARS = 6
+
+# Allowance for the non-file fields of the leave request form
+FORM_FIELDS_MAX_SIZE = 1024 * 1024
+
 class LeaveController(http.Controller):
     
     @http.route('/leave/request', type='http', auth='public', website=True, method=['GET','POST'])
     def leave_request_form(self, **kwargs):
         """Render the leave request form page"""
         try:
-            # Get time off types for the form
-            time_off_types = request.env['hr.leave.type'].sudo().search([
-                ('active', '=', True)
-            ])
-            
-            employee_number = request.session.get('employee_number')
-            _logger.info("DEBUG: employee_number from session = %s", employee_number)
-            
-            employee = False
-            if employee_number:
-                employee = request.env['hr.employee'].sudo().search([('id', '=', employee_number)], limit=1)
-                _logger.info("DEBUG: employee search result = %s", employee)
-            if not employee or not employee.exists():
-                # Pass an explicit None or False value for employee
+            employee_context = get_portal_employee_context()
+            if not employee_context:
                 return request.redirect('/employee/register')
+            employee = request.env['hr.employee'].sudo().browse(employee_context['id'])
+
+            # Embed eligible types and balances so the form renders without extra round trips;
+            # without them the form fetches the same data from the API
+            bootstrap = None
+            try:
+                with request.env.cr.savepoint():
+                    today = date.today()
+                    balances = request.env['hr.leave.balance.cache'].sudo()._get_balances(employee, today)
+                    bootstrap = json.dumps({
+                        'time_off_types': self._get_eligible_time_off_types(employee_context),
+                        'leave_balance': dict(balances, success=True),
+                        'taken_days': self._get_taken_days(employee),
+                        'working_calendar': self._get_working_calendar_data(employee, [today.year, today.year + 1]),
+                    })
+            except Exception as e:
+                _logger.exception("Error preparing the leave request form data: %s", str(e))
+
             return request.render('custom_leave_request.leave_request_form_template', {
-                'time_off_types': time_off_types,
                 'employee': employee,
+                'employee_context': employee_context,
+                'bootstrap': bootstrap,
                 'page_title': 'Submit Leave Request'
             })
             
@@ -64,32 +99,43 @@ class LeaveController(http.Controller):
         })
       
     @http.route('/leave/requests', type='http', auth='public', website=True)
-    def my_leave_requests(self, **kwargs):
-        """Show employee's leave requests"""
+    def my_leave_requests(self, year=None, state=None, holiday_status_id=None, after=None, **kwargs):
+        """Show employee's leave requests, one keyset page at a time with filters and per-state totals"""
         try:
-            employee_number = request.session.get('employee_number')
-            if not employee_number:
+            if not request.session.get('employee_number'):
                 return request.redirect('/employee/register')
-            
-            employee = request.env['hr.employee'].sudo().browse(int(employee_number))
-            if not employee.exists():
+
+            employee_context = get_portal_employee_context()
+            if not employee_context:
                 return request.render('custom_leave_request.leave_requests_list_template', {
                     'error': 'Employee not found',
                     'leave_requests': [],
                     'page_title': 'My Leave Requests'
                 })
-            
-            # Get employee's leave requests
-            leave_requests = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id)
-            ], order='create_date desc')
+            employee = request.env['hr.employee'].sudo().browse(employee_context['id'])
 
-            
-            
+            filters = {
+                'year': year if (year or '').isdigit() else '',
+                'state': state if state in LEAVE_STATE_LABELS else '',
+                'holiday_status_id': holiday_status_id if (holiday_status_id or '').isdigit() else '',
+            }
+            leave_requests, next_cursor, summary = request.env['hr.leave'].sudo()._get_portal_history(
+                employee.id, after=after, **filters)
+
+            active_filters = {key: value for key, value in filters.items() if value}
+            this_year = date.today().year
             return request.render('custom_leave_request.leave_requests_list_template', {
                 'employee': employee,
                 'leave_requests': leave_requests,
-                'page_title': f'{employee.name} - Leave Requests'
+                'filters': filters,
+                'summary': summary,
+                'state_labels': LEAVE_STATE_LABELS,
+                'years': range(this_year + 1, this_year - HISTORY_YEARS, -1),
+                'leave_types': request.env['hr.leave.type'].sudo().search([('active', '=', True)]),
+                'first_page_url': '/leave/requests?%s' % url_encode(active_filters),
+                'next_page_url': next_cursor and '/leave/requests?%s' % url_encode(dict(active_filters, after=next_cursor)),
+                'is_first_page': not after,
+                'page_title': f"{employee_context['name']} - Leave Requests"
             })
             
         except Exception as e:
@@ -100,85 +146,100 @@ class LeaveController(http.Controller):
                 'page_title': 'My Leave Requests'
             })
     
+    def _get_request_employee(self, employee_number=None):
+        """Employee a portal API call is about, and its portal context.
+
+        The session employee (also when the client sends its own id or
+        employee number) comes from the cached session context without
+        querying hr.employee; other identifiers are searched.
+        """
+        employee_context = get_portal_employee_context()
+        if employee_context and (not employee_number or str(employee_number) in (
+                str(employee_context['id']), employee_context['employee_number'])):
+            return request.env['hr.employee'].sudo().browse(employee_context['id']), employee_context
+        if not employee_number:
+            return request.env['hr.employee'], None
+        employee = request.env['hr.employee'].sudo()._resolve_portal_employee(employee_number)
+        return employee, employee and build_employee_context(employee)
+
+    def _get_eligible_time_off_types(self, employee_context):
+        """Leave types an employee may request under the portal rules, as JSON-ready dicts.
+
+        ``employee_context`` is the employee's portal context (see portal_session).
+        """
+        gender = (employee_context['gender'] or '').lower()
+        marital_status = (employee_context['marital'] or '').lower()
+        join_date = fields.Date.to_date(employee_context['join_date'])
+        lower_tags = [t.lower() for t in employee_context['tags']]
+        today = datetime.today().date()
+
+        # Calculate service duration in months
+        service_months = 0
+        if join_date:
+            delta = relativedelta(today, join_date)
+            service_months = delta.years * 12 + delta.months
+
+        eligible_leaves = []
+
+        # -------------------
+        # Rule 1: Intern/Probation
+        # -------------------
+        if 'intern' in lower_tags or 'probation' in lower_tags:
+            eligible_leaves = ['Unpaid Leave']
+
+        # -------------------
+        # Rule 2: Permanent
+        # -------------------
+        elif 'permanent' in lower_tags:
+            # Always include casual, funeral, unpaid
+            eligible_leaves = ['Casual Leave', 'Funeral Leave', 'Unpaid Leave']
+
+            # Annual leave if service ≥ 12 months
+            if service_months >= 12:
+                eligible_leaves.append('Annual Leave')
+
+            # Medical leave if service ≥ 6 months
+            if service_months >= 6:
+                eligible_leaves.append('Medical Leave')
+
+            # Marriage leave if single and service ≥ 12 months
+            if marital_status == 'single' and service_months >= 12:
+                eligible_leaves.append('Marriage Leave')
+
+            # Maternity/Paternity leave if married
+            if marital_status == 'married':
+                if gender == 'female':
+                    eligible_leaves.append('Maternity Leave')
+                elif gender == 'male':
+                    eligible_leaves.append('Paternity Leave')
+
+        # -------------------
+        # Fetch only rule-based leave type records
+        # -------------------
+        LeaveType = request.env['hr.leave.type'].sudo()
+        time_off_types = LeaveType.browse(LeaveType._get_active_type_ids(eligible_leaves))
+
+        return [{
+            'id': lt.id,
+            'name': lt.name,
+            'color': lt.color or 1,
+            'requires_allocation': lt.requires_allocation,
+            'leave_validation_type': lt.leave_validation_type
+        } for lt in time_off_types]
+
     @http.route('/api/time-off-types', type='json', auth='public', methods=['POST'], csrf=False)
     def get_time_off_types(self):
         """Return eligible leave types for an employee (rules only, no balances)."""
         try:
             data = request.jsonrequest or {}
-            employee_number = data.get('employee_number') or request.session.get('employee_number')
-
-            employee = False
-            if employee_number:
-                employee = request.env['hr.employee'].sudo().search([
-                    '|', ('id', '=', employee_number),
-                    ('employee_number', '=', employee_number)
-                ], limit=1)
+            employee_number = data.get('employee_number')
 
-            if not employee or not employee.exists():
+            employee, employee_context = self._get_request_employee(employee_number)
+            if not employee:
                 _logger.info("No employee found for employee_number: %s", employee_number)
                 return {'success': True, 'result': []}
 
-            gender = (employee.gender or '').lower()
-            marital_status = (employee.marital or '').lower()
-            join_date = employee.join_date
-            lower_tags = [t.lower() for t in employee.category_ids.mapped('name')]
-            today = datetime.today().date()
-
-            # Calculate service duration in months
-            service_months = 0
-            if join_date:
-                delta = relativedelta(today, join_date)
-                service_months = delta.years * 12 + delta.months
-
-            eligible_leaves = []
-
-            # -------------------
-            # Rule 1: Intern/Probation
-            # -------------------
-            if 'intern' in lower_tags or 'probation' in lower_tags:
-                eligible_leaves = ['Unpaid Leave']
-
-            # -------------------
-            # Rule 2: Permanent
-            # -------------------
-            elif 'permanent' in lower_tags:
-                # Always include casual, funeral, unpaid
-                eligible_leaves = ['Casual Leave', 'Funeral Leave', 'Unpaid Leave']
-
-                # Annual leave if service ≥ 12 months
-                if service_months >= 12:
-                    eligible_leaves.append('Annual Leave')
-
-                # Medical leave if service ≥ 6 months
-                if service_months >= 6:
-                    eligible_leaves.append('Medical Leave')
-
-                # Marriage leave if single and service ≥ 12 months
-                if marital_status == 'single' and service_months >= 12:
-                    eligible_leaves.append('Marriage Leave')
-
-                # Maternity/Paternity leave if married
-                if marital_status == 'married':
-                    if gender == 'female':
-                        eligible_leaves.append('Maternity Leave')
-                    elif gender == 'male':
-                        eligible_leaves.append('Paternity Leave')
-
-            # -------------------
-            # Fetch only rule-based leave type records
-            # -------------------
-            time_off_types = request.env['hr.leave.type'].sudo().search([
-                ('name', 'in', eligible_leaves),
-                ('active', '=', True)
-            ])
-
-            result = [{
-                'id': lt.id,
-                'name': lt.name,
-                'color': lt.color or 1,
-                'requires_allocation': lt.requires_allocation,
-                'leave_validation_type': lt.leave_validation_type
-            } for lt in time_off_types]
+            result = self._get_eligible_time_off_types(employee_context)
 
             _logger.info("[API] Returning rule-based time off types: %s", [t['name'] for t in result])
             return {'success': True, 'result': result}
@@ -221,12 +282,21 @@ class LeaveController(http.Controller):
             data = request.params
             files = request.httprequest.files
 
+            # Refuse oversized bodies and unsupported files before reading the attachment
+            if (request.httprequest.content_length or 0) > ATTACHMENT_MAX_SIZE + FORM_FIELDS_MAX_SIZE:
+                return request.make_response(json.dumps({'success': False, 'error': 'The attachment is too large'}), headers=[('Content-Type', 'application/json')])
+            if 'attachment' in files and files['attachment'].filename:
+                try:
+                    check_attachment_limits(files['attachment'].filename)
+                except UserError as e:
+                    return request.make_response(json.dumps({'success': False, 'error': str(e)}), headers=[('Content-Type', 'application/json')])
+
             required_fields = ['employee_number', 'holiday_status_id', 'request_date_from', 'request_date_to', 'name']
             for field in required_fields:
                 if not data.get(field):
                     return request.make_response(json.dumps({'success': False, 'error': f'Missing required field: {field}'}), headers=[('Content-Type', 'application/json')])
 
-            employee = request.env['hr.employee'].sudo().search([('employee_number', '=', data['employee_number'])], limit=1)
+            employee = request.env['hr.employee'].sudo()._get_employee_by_number(data['employee_number'])
             if not employee:
                 return request.make_response(json.dumps({'success': False, 'error': 'Employee not found'}), headers=[('Content-Type', 'application/json')])
 
@@ -239,8 +309,11 @@ class LeaveController(http.Controller):
             if date_from > date_to:
                 return request.make_response(json.dumps({'success': False, 'error': 'From date cannot be after to date'}), headers=[('Content-Type', 'application/json')])
 
-            number_of_days = float(data.get('number_of_days') or 1)
+            # Computed here from the working calendar, the posted value is only the client's preview
             request_unit_half = data.get('half_day') == 'on'
+            number_of_days = self._calculate_leave_days(employee, date_from, date_to, request_unit_half)
+            if not number_of_days:
+                return request.make_response(json.dumps({'success': False, 'error': 'The selected dates contain no working day'}), headers=[('Content-Type', 'application/json')])
 
             leave_values = {
                 'name': data['name'],
@@ -257,26 +330,46 @@ class LeaveController(http.Controller):
             if request.env.user.id != request.env.ref('base.public_user').id:
                 leave_values['user_id'] = request.env.user.id
 
+            # A retried submission replays the original response instead of creating another leave
+            idempotency_key = (data.get('idempotency_key') or '')[:IDEMPOTENCY_KEY_MAX_LENGTH]
+            if idempotency_key:
+                previous = request.env['hr.leave.request.idempotency'].sudo()._reserve(idempotency_key, employee)
+                if previous is not None:
+                    return request.make_response(json.dumps(previous), headers=[('Content-Type', 'application/json')])
+
+            # Authoritative overlap check, after the key so a replay is not rejected by its own leave
+            check = self._check_leave_conflicts(employee, date_from, date_to)
+            if not check['success']:
+                # Release the idempotency key, the corrected request may reuse it
+                request.env.cr.rollback()
+                return request.make_response(json.dumps(check), headers=[('Content-Type', 'application/json')])
+
             leave_request = request.env['hr.leave'].sudo().create(leave_values)
 
-            # Attach file if provided
-            if 'attachment' in files:
+            # Attach file if provided: streamed to the filestore, or uploaded beforehand in chunks
+            if data.get('attachment_upload_key'):
+                upload = request.env['hr.leave.attachment.upload'].sudo().search([
+                    ('upload_key', '=', data['attachment_upload_key']),
+                    ('employee_id', '=', employee.id),
+                ], limit=1)
+                if not upload:
+                    raise UserError(_("The attachment upload was not found, please attach the file again."))
+                upload._attach_to(leave_request)
+            elif 'attachment' in files:
                 uploaded_file = files['attachment']
                 filename = secure_filename(uploaded_file.filename)
-                file_content = uploaded_file.read()
-                if filename and file_content:
-                    request.env['ir.attachment'].sudo().create({
+                if filename:
+                    # From the start: a retried request reads the same upload again
+                    uploaded_file.stream.seek(0)
+                    request.env['ir.attachment'].sudo()._create_from_stream(uploaded_file.stream, {
                         'name': filename,
-                        'datas': base64.b64encode(file_content),
                         'res_model': 'hr.leave',
                         'res_id': leave_request.id,
-                        'type': 'binary',
-                        'mimetype': uploaded_file.mimetype,
-                    })
+                        'mimetype': check_attachment_limits(filename),
+                    }, ATTACHMENT_MAX_SIZE)
             
-            _logger.info("DEBUG: Triggering first approval email for leave %s", leave_request.id)
-            leave_request._compute_approvers()
-            leave_request._send_first_approval_notification()
+            # Approvers are notified by the job queue once this transaction is committed
+            request.env['hr.leave.notification.job'].sudo()._enqueue(leave_request, 'first_approval')
 
             result_data = {
                 'leave_id': leave_request.id,
@@ -289,33 +382,155 @@ class LeaveController(http.Controller):
                 'description': leave_request.name,
             }
 
-            return request.make_response(json.dumps({
+            response = {
                 'success': True,
                 'message': 'Leave request submitted successfully',
                 'data': result_data
-            }), headers=[('Content-Type', 'application/json')])
-
+            }
+            if idempotency_key:
+                request.env['hr.leave.request.idempotency'].sudo()._store(idempotency_key, response)
+            return request.make_response(json.dumps(response), headers=[('Content-Type', 'application/json')])
+
+        except psycopg2.OperationalError as e:
+            if e.pgcode in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                # Let Odoo retry the request: a concurrent submission with the
+                # same idempotency key committed, the retry replays its response
+                raise
+            _logger.exception("Leave submission error: %s", str(e))
+            request.env.cr.rollback()
+            return request.make_response(json.dumps({'success': False, 'error': str(e)}), headers=[('Content-Type', 'application/json')])
         except Exception as e:
             _logger.exception("Leave submission error: %s", str(e))
             request.env.cr.rollback()
             return request.make_response(json.dumps({'success': False, 'error': str(e)}), headers=[('Content-Type', 'application/json')])
 
     
-    def _calculate_leave_days(self, date_from, date_to, leave_type):
-        """Calculate the number of leave days, excluding weekends if configured"""
+    @http.route('/api/leave-attachment/upload/start', type='json', auth='public', methods=['POST'], csrf=False)
+    def start_attachment_upload(self, upload_key=None, filename=None, size=None, checksum=None, **kwargs):
+        """Start or resume a chunked attachment upload, returning how many bytes were received.
+
+        With the file's SHA-1 ``checksum``, a file the employee already uploaded
+        is reused and the upload is done at once.
+        """
         try:
-            # Basic calculation - can be enhanced based on company calendar
-            total_days = (date_to - date_from).days + 1
-        
-            return max(total_days, 0)
-            
+            employee = get_portal_employee()
+            if not employee:
+                return {'success': False, 'error': 'Not logged in'}
+            if not upload_key or not filename or size is None:
+                return {'success': False, 'error': 'Missing upload_key, filename or size'}
+
+            upload = request.env['hr.leave.attachment.upload'].sudo()._start(
+                employee, upload_key, secure_filename(filename), int(size), checksum)
+            return {
+                'success': True,
+                'received_size': upload.received_size,
+                'done': bool(upload.attachment_id),
+            }
+
+        except UserError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
-            _logger.error("Error calculating leave days: %s", str(e))
-            return (date_to - date_from).days + 1
-    
+            _logger.exception("Error starting attachment upload")
+            return {'success': False, 'error': str(e)}
+
+    @http.route('/api/leave-attachment/dedup-stats', type='json', auth='user', methods=['POST'], csrf=False)
+    def get_attachment_dedup_stats(self, **kwargs):
+        """Filestore space saved by deduplicated leave attachments, for HR"""
+        if not request.env.user.has_group('hr_holidays.group_hr_holidays_user'):
+            return {'success': False, 'error': 'Access denied'}
+        result = {'success': True}
+        result.update(request.env['ir.attachment'].sudo()._get_leave_dedup_stats())
+        return result
+
+    @http.route('/api/leave-attachment/upload/chunk', type='http', auth='public', methods=['POST'], csrf=False)
+    def upload_attachment_chunk(self, upload_key=None, offset=0, **kwargs):
+        """Append one chunk (multipart field ``chunk``) at ``offset`` to a started upload"""
+        try:
+            employee = get_portal_employee()
+            chunk = request.httprequest.files.get('chunk')
+            upload = employee and request.env['hr.leave.attachment.upload'].sudo().search([
+                ('upload_key', '=', upload_key),
+                ('employee_id', '=', employee.id),
+            ], limit=1)
+            if not upload or not chunk:
+                return request.make_response(json.dumps({'success': False, 'error': 'Unknown upload'}), headers=[('Content-Type', 'application/json')])
+
+            upload._append_chunk(int(offset), chunk.stream)
+            return request.make_response(json.dumps({
+                'success': True,
+                'received_size': upload.received_size,
+                'done': bool(upload.attachment_id),
+            }), headers=[('Content-Type', 'application/json')])
+
+        except UserError as e:
+            request.env.cr.rollback()
+            return request.make_response(json.dumps({'success': False, 'error': str(e)}), headers=[('Content-Type', 'application/json')])
+        except Exception as e:
+            _logger.exception("Error uploading attachment chunk")
+            request.env.cr.rollback()
+            return request.make_response(json.dumps({'success': False, 'error': str(e)}), headers=[('Content-Type', 'application/json')])
+
+    @http.route('/api/leave-import', type='http', auth='user', methods=['POST'], csrf=False)
+    def import_leaves(self, file_format='csv', dry_run=None, **kwargs):
+        """Bulk import of leaves (CSV or JSON lines in the ``file`` field) for HR back-office loads"""
+        try:
+            if not request.env.user.has_group('hr_holidays.group_hr_holidays_manager'):
+                return request.make_response(json.dumps({'success': False, 'error': 'Access denied'}), headers=[('Content-Type', 'application/json')])
+            uploaded_file = request.httprequest.files.get('file')
+            if not uploaded_file:
+                return request.make_response(json.dumps({'success': False, 'error': 'Missing file'}), headers=[('Content-Type', 'application/json')])
+
+            report = request.env['hr.leave.import']._import_leaves(
+                uploaded_file.read(), file_format, dry_run=dry_run in ('1', 'true', 'on'))
+            report['success'] = True
+            return request.make_response(json.dumps(report), headers=[('Content-Type', 'application/json')])
+
+        except Exception as e:
+            _logger.exception("Leave import error")
+            request.env.cr.rollback()
+            return request.make_response(json.dumps({'success': False, 'error': str(e)}), headers=[('Content-Type', 'application/json')])
+
+    def _get_working_calendar(self, employee):
+        return employee._get_leave_calendar()
+
+    def _calculate_leave_days(self, employee, date_from, date_to, half_day=False):
+        """Number of leave days: working days of the employee's calendar, public holidays excluded"""
+        total_days = employee._count_leave_days(date_from, date_to)
+        return total_days / 2 if half_day else total_days
+
+    def _get_working_calendar_data(self, employee, years):
+        """Working-day bitmaps the form uses to preview durations like _calculate_leave_days"""
+        working_calendar = self._get_working_calendar(employee)
+        if not working_calendar:
+            return {}
+        return {
+            'years': {str(year): working_calendar._get_working_day_bitmap(year) for year in years},
+        }
+
+    @http.route('/api/leave/working-calendar', type='json', auth='public', methods=['POST'], csrf=False)
+    def get_working_calendar(self, years=None, **kwargs):
+        """Working-day bitmaps of the session employee's calendar for ``years``"""
+        try:
+            employee = get_portal_employee()
+            if not employee:
+                return {'success': False, 'error': 'Employee not found'}
+
+            today = date.today()
+            years = [int(year) for year in (years or [today.year, today.year + 1])][:WORKING_CALENDAR_MAX_YEARS]
+            result = {'success': True}
+            result.update(self._get_working_calendar_data(employee.sudo(), years))
+            return result
+
+        except Exception as e:
+            _logger.exception("Error in get_working_calendar")
+            return {'success': False, 'error': str(e)}
+
     @http.route('/api/leave-requests', type='json', auth='user', methods=['GET'], csrf=False)
-    def get_my_leave_requests(self):
-        """Get leave requests for the logged-in employee"""
+    def get_my_leave_requests(self, year=None, state=None, holiday_status_id=None, after=None, limit=None, **kwargs):
+        """Get leave requests for the logged-in employee, one keyset page at a time.
+
+        Pass the returned ``next_cursor`` as ``after`` to get the next page.
+        """
         try:
             # Find the employee linked to the logged-in user
             employee = request.env['hr.employee'].sudo().search([
@@ -325,10 +540,8 @@ class LeaveController(http.Controller):
             if not employee:
                 return {'success': False, 'error': 'Employee not linked to this user'}
 
-            # Get leave requests
-            leave_requests = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id)
-            ], order='create_date desc')
+            leave_requests, next_cursor, summary = request.env['hr.leave'].sudo()._get_portal_history(
+                employee.id, year=year, state=state, holiday_status_id=holiday_status_id, after=after, limit=limit)
 
             result = []
             for leave in leave_requests:
@@ -343,12 +556,78 @@ class LeaveController(http.Controller):
                     'create_date': leave.create_date.strftime('%Y-%m-%d %H:%M:%S') if leave.create_date else ''
                 })
 
-            return {'success': True, 'result': result}
+            return {'success': True, 'result': result, 'next_cursor': next_cursor, 'summary': summary}
 
         except Exception as e:
             _logger.exception("Error fetching leave requests: %s", str(e))
             return {'success': False, 'error': str(e)}
 
+    def _check_leave_conflicts(self, employee, date_from, date_to):
+        """Overlap and adjacency rules against the employee's approved leaves.
+
+        Used by /api/check/leave/valid and enforced again by /api/leave-request.
+        Returns ``{'success': True, 'conflicts': []}`` or the error with its conflicts.
+        """
+        # ✅ One daterange query (&& overlap, -|- adjacent) for approved leaves, classified
+        # below: overlapping the request, ending the day before or starting the day after
+        Leave = request.env['hr.leave'].sudo()
+        leaves = Leave._get_range_conflicts(employee.id, date_from, date_to)
+        leave_types = {
+            leave_type.id: leave_type.display_name
+            for leave_type in request.env['hr.leave.type'].sudo().browse(
+                {leave['holiday_status_id'] for leave in leaves if leave['holiday_status_id']})
+        }
+
+        conflicts = {'overlap': [], 'before': [], 'after': []}
+        for leave in leaves:
+            if leave['overlaps']:
+                kind = 'overlap'
+            elif leave['request_date_to'] < date_from:
+                kind = 'before'
+            else:
+                kind = 'after'
+            conflicts[kind].append({
+                'kind': kind,
+                'leave_id': leave['id'],
+                'leave_type': leave_types.get(leave['holiday_status_id'], ''),
+                'date_from': fields.Date.to_string(leave['request_date_from']),
+                'date_to': fields.Date.to_string(leave['request_date_to']),
+            })
+
+        if conflicts['overlap']:
+            errors = []
+            for conflict in conflicts['overlap']:
+                if conflict['date_from'] == conflict['date_to']:
+                    # Single day leave
+                    errors.append(f"Date {conflict['date_from']} is already taken as {conflict['leave_type']}")
+                else:
+                    # Multi-day leave
+                    errors.append(
+                        f"Date ({conflict['date_from']} → {conflict['date_to']}) "
+                        f"is already taken as {conflict['leave_type']}"
+                    )
+            return {
+                'success': False,
+                'error': "; ".join(errors),
+                'conflicts': conflicts['overlap'],
+            }
+
+        if conflicts['before']:
+            return {
+                'success': False,
+                'error': 'Casual Leave cannot be combined with any other form of leave before the start date.',
+                'conflicts': conflicts['before'],
+            }
+
+        if conflicts['after']:
+            return {
+                'success': False,
+                'error': 'Casual Leave cannot be combined with any other form of leave after the end date.',
+                'conflicts': conflicts['after'],
+            }
+
+        return {'success': True, 'conflicts': []}
+
     @http.route('/api/check/leave/valid', type='json', auth='user', methods=['POST'], csrf=False)
     def check_leave_valid(self, **kwargs):
         try:
@@ -357,11 +636,8 @@ class LeaveController(http.Controller):
             request_date_from = data.get('request_date_from')
             request_date_to = data.get('request_date_to')
 
-            # Log incoming data for debugging
-            print("DEBUG - Incoming data:")
-            print(f"  employee_number: {employee_number}")
-            print(f"  request_date_from: {request_date_from} ({type(request_date_from)})")
-            print(f"  request_date_to: {request_date_to} ({type(request_date_to)})")
+            _logger.debug("check_leave_valid: employee_number=%s, from=%s, to=%s",
+                          employee_number, request_date_from, request_date_to)
 
             # Validate input presence
             if not employee_number or not request_date_from or not request_date_to:
@@ -374,75 +650,51 @@ class LeaveController(http.Controller):
             try:
                 date_from = datetime.strptime(request_date_from, '%Y-%m-%d').date()
                 date_to = datetime.strptime(request_date_to, '%Y-%m-%d').date()
-            except Exception as parse_err:
-                print("ERROR parsing dates:", parse_err)
+            except Exception:
                 return {
                     'success': False,
                     'error': 'Dates must be in string format: YYYY-MM-DD'
                 }
 
             # Find employee
-            employee = request.env['hr.employee'].sudo().search([('employee_number', '=', employee_number)], limit=1)
+            employee = request.env['hr.employee'].sudo()._get_employee_by_number(employee_number)
             if not employee:
                 return {'success': False, 'error': 'Employee not found'}
 
-            # ✅ Check overlapping leaves (approved)
-            overlapping_leaves = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('state', '=', 'validate'),
-                ('request_date_from', '<=', date_to),
-                ('request_date_to', '>=', date_from)
-            ])
+            return self._check_leave_conflicts(employee, date_from, date_to)
 
-            if overlapping_leaves:
-                errors = []
-                for leave in overlapping_leaves:
-                    if leave.request_date_from == leave.request_date_to:
-                        # Single day leave
-                        errors.append(
-                            f"Date {leave.request_date_from} is already taken as {leave.holiday_status_id.display_name}"
-                        )
-                    else:
-                        # Multi-day leave
-                        errors.append(
-                            f"Date ({leave.request_date_from} → {leave.request_date_to}) "
-                            f"is already taken as {leave.holiday_status_id.display_name}"
-                        )
-                return {
-                    'success': False,
-                    'error': "; ".join(errors)
-                }
+        except Exception as e:
+            _logger.exception("Error in check_leave_valid")
+            return {'success': False, 'error': str(e)}
+        
 
-            # ✅ Check leaves before the start date
-            before_leaves = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('state', '=', 'validate'),
-                ('request_date_to', '=', date_from - timedelta(days=1))
-            ])
-            if before_leaves:
-                return {
-                    'success': False,
-                    'error': 'Casual Leave cannot be combined with any other form of leave before the start date.'
-                }
+    def _get_taken_days(self, employee, months=TAKEN_DAYS_DEFAULT_MONTHS):
+        """Approved and pending leave days of ``employee`` from the start of the current month"""
+        start = date.today().replace(day=1)
+        end = start + relativedelta(months=months) - timedelta(days=1)
+        return {
+            'start': fields.Date.to_string(start),
+            'end': fields.Date.to_string(end),
+            'codes': TAKEN_DAY_CODES,
+            'runs': request.env['hr.leave'].sudo()._get_taken_day_runs(employee.id, start, end),
+        }
 
-            # ✅ Check leaves after the end date
-            after_leaves = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('state', '=', 'validate'),
-                ('request_date_from', '=', date_to + timedelta(days=1))
-            ])
-            if after_leaves:
-                return {
-                    'success': False,
-                    'error': 'Casual Leave cannot be combined with any other form of leave after the end date.'
-                }
+    @http.route('/api/leave/taken-days', type='json', auth='public', methods=['POST'], csrf=False)
+    def get_taken_days(self, months=TAKEN_DAYS_DEFAULT_MONTHS, **kwargs):
+        """Run-length encoded leave days so the form can check dates without a server call"""
+        try:
+            employee, _employee_context = self._get_request_employee(kwargs.get('employee_number'))
+            if not employee:
+                return {'success': False, 'error': 'Employee not found'}
 
-            return {'success': True}
+            months = max(1, min(int(months or TAKEN_DAYS_DEFAULT_MONTHS), TAKEN_DAYS_MAX_MONTHS))
+            result = {'success': True}
+            result.update(self._get_taken_days(employee, months))
+            return result
 
         except Exception as e:
-            print("ERROR - Exception in check_leave_valid:", e)
+            _logger.exception("Error in get_taken_days")
             return {'success': False, 'error': str(e)}
-        
 
     @http.route('/api/leave-balance', type='json', auth='public', methods=['POST'], csrf=False)
     def get_leave_balance_with_tracker(self, **kwargs):
@@ -450,867 +702,85 @@ class LeaveController(http.Controller):
             _logger.info("Called /api/leave-balance with kwargs: %s", kwargs)
 
             # --- Employee check ---
-            employee_number = kwargs.get('employee_number') or request.session.get('employee_number')
-            if not employee_number:
-                _logger.debug("Missing employee_number in request")
-                return {'success': False, 'error': 'Missing employee_number'}
-
             today = date.today()
-            current_year = today.year
-            _logger.info("Today's date: %s, Current year: %s", today, current_year)
 
-            employee = request.env['hr.employee'].sudo().search([
-                '|', ('id', '=', employee_number),
-                ('employee_number', '=', employee_number)
-            ], limit=1)
+            employee, _employee_context = self._get_request_employee(kwargs.get('employee_number'))
             if not employee:
-                _logger.debug("No employee found with employee_number: %s", employee_number)
+                _logger.debug("No employee found with employee_number: %s", kwargs.get('employee_number'))
                 return {'success': False, 'error': 'Employee not found'}
 
-            _logger.info("Found employee: %s (ID: %s)", employee.name, employee.id)
-
-            # --- Leave types ---
-            leave_types = [
-                {'name': 'casual', 'display_name': 'Casual Leave'},
-                {'name': 'annual', 'display_name': 'Annual Leave'},
-                {'name': 'medical', 'display_name': 'Medical Leave'},
-                {'name': 'funeral', 'display_name': 'Funeral Leave'},
-                {'name': 'marriage', 'display_name': 'Marriage Leave'},
-                {'name': 'unpaid', 'display_name': 'Unpaid Leave'},
-                {'name': 'maternity', 'display_name': 'Maternity Leave'},
-                {'name': 'paternity', 'display_name': 'Paternity Leave'},
-            ]
+            # Read-only: balances come from the shared cache or one snapshot of the employee's
+            # leaves and trackers, trackers are only stored by the explicit recompute path
+            balances = request.env['hr.leave.balance.cache'].sudo()._get_balances(employee, today)
 
             result = {'success': True}
-
-            for leave_type in leave_types:
-                _logger.info("Processing leave type: %s (%s)", leave_type['name'], leave_type['display_name'])
-
-                tracker_record = request.env['hr.leave.tracker'].sudo().search([
-                    ('employee_id', '=', employee.id),
-                    ('leave_type_name', '=', leave_type['display_name']),
-                    ('year', '=', current_year)
-                ], limit=1)
-
-                if tracker_record:
-                    # Use updated tracker logic to compute final leave balances
-                    leave_balance = self._update_existing_record(tracker_record, employee, today)
-
-                    # --- Ensure system_taken is always present ---
-                    if 'system_taken' not in leave_balance:
-                        leave_balance['system_taken'] = leave_balance.get('taken', 0)
-
-                    # --- Decide what to store in taken_leaves ---
-                    if leave_type['display_name'] == 'Annual Leave':
-                        cutoff = date(today.year, 6, 30)
-                        if today > cutoff:
-                            taken_to_store = leave_balance.get('system_taken', 0)
-                        else:
-                            taken_to_store = leave_balance.get('taken', 0)
-                    else:
-                        taken_to_store = leave_balance.get('taken', 0)
-
-                    # --- Recalculate available as total - taken_to_store ---
-                    total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
-                    available_to_store = total_to_check - taken_to_store
-
-                    tracker_record.sudo().write({
-                        'taken_leaves': taken_to_store,
-                        'pending_requests': leave_balance.get('pending', 0),
-                        'current_balance': available_to_store,
-                        'annual_carry': leave_balance.get('carried_forward', 0),
-                        'expired_carry': leave_balance.get('expired_carried', 0),
-                        'write_date': fields.Datetime.now(),
-                        'write_uid': request.env.user.id,
-                        # total_allocation left unchanged
-                    })
-
-                    # Sync response dict
-                    leave_balance['taken'] = taken_to_store
-                    leave_balance['available'] = available_to_store
-
-                else:
-                    # No tracker: calculate default balance and create record
-                    balance_dict = self._calculate_default_leave_balance(
-                        leave_type['display_name'], employee, today
-                    )
-                    leave_balance = self._create_tracker_record(
-                        employee, leave_type, balance_dict, current_year
-                    )
-
-                # --- Ensure all numeric fields exist and are not None ---
-                for key in ['total', 'total_dynamic', 'accrued_new', 'taken', 'available', 'pending', 'carried_forward', 'expired_carried']:
-                    leave_balance[key] = leave_balance.get(key) or 0
-
-                total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
-
-                if total_to_check > 0 or leave_balance.get('pending', 0) > 0 or leave_balance.get('taken', 0) > 0:
-                    _logger.info("✅ Final leave_balance for %s: %s", leave_type['display_name'], leave_balance)
-                    result[leave_type['name']] = leave_balance
-                    
-                else:
-                    _logger.info("⏩ Skipping %s (no total, no taken, no pending)", leave_type['display_name'])
-
+            result.update(balances)
             return result
 
         except Exception as e:
             _logger.exception("Error in get_leave_balance_with_tracker")
             return {'success': False, 'error': str(e)}
 
-    def _get_system_start_date(self):
-        """Define when your system started tracking leaves in hr_leave"""
-        return date(2025, 9, 26)  # Updated to match requirements
-
-    def _get_permanent_date(self, employee):
-        """Get employee's permanent date"""
-        # Check if permanent_date field exists, otherwise calculate from join_date
-        if hasattr(employee, 'permanent_date') and employee.permanent_date:
-            return employee.permanent_date
-        elif employee.join_date:
-            return employee.join_date + relativedelta(years=1)
-        return None
-
-    def _is_historical_data(self, year, record_create_date=None):
-        """Enhanced method to properly detect historical data"""
-        system_start_date = self._get_system_start_date()
-        system_start_year = system_start_date.year
-        year_start = date(year, 1, 1)
-        
-        _logger.info(f"Checking historical data for year {year}: system_start={system_start_date}, year_start={year_start}")
-        
-        # If year is before system start year → always historical
-        if year < system_start_year:
-            _logger.info(f"Year {year} < system start year {system_start_year} → HISTORICAL")
-            return True
-        
-        # If same year as system start
-        if year == system_start_year:
-            if record_create_date:
-                # Created before system start date → historical
-                if record_create_date < system_start_date:
-                    _logger.info(f"Record created {record_create_date} < system start {system_start_date} → HISTORICAL")
-                    return True
-            else:
-                # No create_date? Check if year start is before system start
-                if year_start < system_start_date:
-                    _logger.info(f"Year start {year_start} < system start {system_start_date}, no create date → HISTORICAL")
-                    return True
-        
-        _logger.info(f"Year {year} → REAL-TIME")
-        return False
-
-    def _get_carry_forward_from_previous_year(self, employee, current_year, leave_type_name='Annual Leave'):
-        """Carry forward the remaining balance from the previous year."""
-        previous_year = current_year - 1
-
-        if leave_type_name != 'Annual Leave':
-            return 0
-
-        system_start = self._get_system_start_date()
-        is_prev_year_historical = self._is_historical_data(previous_year)
-
-        previous_tracker = request.env['hr.leave.tracker'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('leave_type_name', '=', leave_type_name),
-            ('year', '=', previous_year)
-        ], limit=1)
-
-        if previous_tracker:
-            try:
-                created_before_start = (
-                    previous_tracker.create_date 
-                    and previous_tracker.create_date.date() <= system_start
-                )
-            except Exception:
-                created_before_start = False
-
-            if created_before_start or is_prev_year_historical:
-                # Always use stored/historical balance
-                return max(
-                    previous_tracker.current_balance or 0, 
-                    0
-                )
-
-            # For normal years, just carry forward previous balance directly
-            return max(previous_tracker.current_balance or 0, 0)
+    @http.route('/api/leave-balance/batch', type='json', auth='user', methods=['POST'], csrf=False)
+    def get_leave_balance_batch(self, employee_ids=None, department_id=None, limit=100, offset=0,
+                                balance_fields=None, leave_types=None, **kwargs):
+        """Balances of many employees in one call, for HR dashboards and team views.
 
-        # If no tracker exists and it's not historical → no carry forward
-        return 0
-
-
-    
-    def _months_accrued(self, start_date, as_of_date, accrue_on_month_start=True):
-        if start_date > as_of_date:
-            return 0
-
-        if not accrue_on_month_start:
-            y, m = start_date.year, start_date.month
-            months = 0
-            while (y, m) <= (as_of_date.year, as_of_date.month):
-                last_day = date(y, m, monthrange(y, m)[1])
-                if last_day <= as_of_date:
-                    months += 1
-                else:
-                    break
-                if m == 12:
-                    y, m = y + 1, 1
-                else:
-                    m += 1
-            return months
-
-        # accrue_on_month_start == True:
-        months = (as_of_date.year - start_date.year) * 12 + (as_of_date.month - start_date.month)
-        if as_of_date.day > 1:
-            months += 1
-        return max(0, months)
-
-    def _update_existing_record(self, record, employee, today):
-        """
-        Idempotent recalculation for trackers with total_dynamic support:
-        - Keep total_allocation unchanged (static base allocation)
-        - Calculate total_dynamic = total_allocation + accrued_new
-        - Use total_dynamic for availability calculations
+        Select employees with ``employee_ids`` and/or ``department_id``; HR
+        officers see every employee, other users only their team. Results are
+        paginated with ``limit``/``offset`` and can be narrowed to some balance
+        keys (``balance_fields``) and leave types (``leave_types``).
         """
-        current_year = today.year
-        record_create_date = record.create_date.date() if record.create_date else None
-        is_historical = self._is_historical_data(current_year, record_create_date)
-
-        if record.leave_type_name in ['Annual Leave', 'Casual Leave']:
-            accrual = (
-                self._calculate_annual_leave_accrual(employee, today)
-                if record.leave_type_name == 'Annual Leave'
-                else self._calculate_casual_leave_accrual(employee, today)
-            )
-
-            if is_historical:
-                system_start = self._get_system_start_date()
-                # Always use imported_taken as base for historical data
-                if hasattr(record, "imported_taken") and record.imported_taken is not None:
-                    base_taken = record.imported_taken
-                else:
-                    base_taken = 0.0
-
-                if base_taken == 0.0:
-                    imported_snapshot = False
-                    if record.create_date:
-                        try:
-                            imported_snapshot = (record.create_date.date() < system_start)
-                        except Exception:
-                            imported_snapshot = False
-
-                    if imported_snapshot:
-                        base_taken = record.taken_leaves or 0.0
-                        try:
-                            record.sudo().write({'imported_taken': base_taken})
-                        except Exception:
-                            pass
-                    else:
-                        base_domain = [
-                            ('employee_id', '=', employee.id),
-                            ('holiday_status_id.name', 'ilike', record.leave_type_name),
-                            ('state', '=', 'validate'),
-                            ('request_date_to', '<', system_start),
-                        ]
-                        base_leaves = request.env['hr.leave'].sudo().search(base_domain)
-                        base_taken = sum(base_leaves.mapped('number_of_days')) or 0.0
-
-                new_taken = self._get_taken_leaves_after_date(
-                    employee.id, record.leave_type_name, current_year, system_start
-                ) or 0.0
-
-                total_taken = base_taken + new_taken
-                pending = self._get_actual_pending_leaves(employee.id, record.leave_type_name, current_year)
-
-                total_allocation = record.total_allocation or 0.0 
-                
-                if record.leave_type_name == 'Annual Leave':
-                    total_dynamic = total_allocation + accrual.get('accrued_new', 0)
-                    available = max(total_dynamic - total_taken, 0.0)
-                    system_taken = accrual.get('system_taken', total_taken)
-                else:
-                    total_dynamic = total_allocation
-                    available = max(total_allocation - total_taken, 0.0)
-                    system_taken = total_taken
-
-                record_vals = {
-                    'taken_leaves': total_taken,
-                    'pending_requests': pending,
-                    'current_balance': available,
-                    'write_date': fields.Datetime.now(),
-                    'write_uid': request.env.user.id,
-                }
-                record.sudo().write(record_vals)
-
-                return {
-                    'total': total_allocation,
-                    'total_dynamic': total_dynamic if record.leave_type_name == 'Annual Leave' else None,
-                    'taken': total_taken,
-                    'system_taken': system_taken,
-                    'available': available,
-                    'pending': pending,
-                    'carried_forward': getattr(record, 'annual_carry', 0),
-                    'expired_carried': getattr(record, 'expired_carry', 0),
-                }
-
-            else:
-                # real-time: use live accrual + actuals
-                total_taken = self._get_actual_taken_leaves(employee.id, record.leave_type_name, current_year)
-                pending = self._get_actual_pending_leaves(employee.id, record.leave_type_name, current_year)
-                
-                total_allocation = record.total_allocation or 0.0
-                
-                if record.leave_type_name == 'Annual Leave':
-                    total_dynamic = accrual['total']
-                    available = max(total_dynamic - total_taken, 0)
-                    system_taken = accrual.get('system_taken', total_taken)
-                else:
-                    total_dynamic = total_allocation
-                    available = max(total_allocation - total_taken, 0)
-                    system_taken = total_taken
-
-                record.sudo().write({
-                    'taken_leaves': total_taken,
-                    'pending_requests': pending,
-                    'current_balance': available,
-                    'annual_carry': accrual.get('carried_forward', 0),
-                    'expired_carry': accrual.get('expired_carried', 0),
-                    'write_date': fields.Datetime.now(),
-                    'write_uid': request.env.user.id,
+        try:
+            if not employee_ids and not department_id:
+                return {'success': False, 'error': 'Missing employee_ids or department_id'}
+
+            domain = [('active', '=', True)]
+            if employee_ids:
+                domain.append(('id', 'in', [int(employee_id) for employee_id in employee_ids]))
+            if department_id:
+                domain.append(('department_id', 'child_of', int(department_id)))
+            if not request.env.user.has_group('hr_holidays.group_hr_holidays_user'):
+                managers = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)])
+                if not managers:
+                    return {'success': False, 'error': 'Access denied'}
+                domain.append(('parent_id', 'child_of', managers.ids))
+
+            limit = max(1, min(int(limit or 100), BATCH_BALANCE_MAX_LIMIT))
+            offset = max(0, int(offset or 0))
+            Employee = request.env['hr.employee'].sudo()
+            total = Employee.search_count(domain)
+            employees = Employee.search(domain, limit=limit, offset=offset, order='id')
+
+            # One snapshot for the whole page: one aggregate over hr.leave, one tracker read
+            results = request.env['hr.leave.balance'].sudo()._compute_balances(employees, date.today())
+
+            rows = []
+            for employee in employees:
+                balances, _plan = results[employee.id]
+                if leave_types:
+                    balances = {name: balance for name, balance in balances.items() if name in leave_types}
+                if balance_fields:
+                    balances = {
+                        name: {key: value for key, value in balance.items() if key in balance_fields}
+                        for name, balance in balances.items()
+                    }
+                rows.append({
+                    'employee_id': employee.id,
+                    'employee_number': employee.employee_number or '',
+                    'name': employee.name,
+                    'department': employee.department_id.name or '',
+                    'balances': balances,
                 })
-                
-                return {
-                    'total': total_allocation,
-                    'total_dynamic': total_dynamic if record.leave_type_name == 'Annual Leave' else None,
-                    'taken': total_taken,
-                    'system_taken': system_taken,
-                    'available': available,
-                    'pending': pending,
-                    'carried_forward': accrual.get('carried_forward', 0),
-                    'expired_carried': accrual.get('expired_carried', 0),
-                }
-
-        else:
-            # For all other leave types, also recalc from hr.leave instead of trusting tracker
-            total_taken = self._get_actual_taken_leaves(employee.id, record.leave_type_name, current_year)
-            pending = self._get_actual_pending_leaves(employee.id, record.leave_type_name, current_year)
-            total_allocation = record.total_allocation or 0.0
-            available = max(total_allocation - total_taken, 0)
-
-            record.sudo().write({
-                'taken_leaves': total_taken,
-                'pending_requests': pending,
-                'current_balance': available,
-                'write_date': fields.Datetime.now(),
-                'write_uid': request.env.user.id,
-            })
 
             return {
-                'total': total_allocation,
-                'taken': total_taken,
-                'system_taken': total_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': getattr(record, 'annual_carry', 0),
-                'expired_carried': getattr(record, 'expired_carry', 0),
-            }
-
-    
-    def _get_taken_leaves_after_date(self, employee_id, leave_type, year, after_date):
-        """Get taken leaves after a specific date in the year"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-        
-        domain = [
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'validate'),
-            ('request_date_from', '>=', max(start_of_year, after_date)),
-            ('request_date_to', '<=', end_of_year)
-        ]
-
-        leaves = request.env['hr.leave'].sudo().search(domain)
-        taken_after_date = sum(leaves.mapped('number_of_days'))
-        
-        _logger.info(f"Taken leaves after {after_date} for {leave_type}: {taken_after_date}")
-        return taken_after_date
-
-    def _create_tracker_record(self, employee, leave_type, balance, year):
-        """Create tracker record with proper handling for historical vs current data"""
-
-        # Check if this should be treated as historical data
-        system_start_date = self._get_system_start_date()
-        year_start = date(year, 1, 1)
-        is_historical_year = year_start < system_start_date
-
-        leave_type_obj = request.env['hr.leave.type'].sudo().search(
-            [('name', '=', leave_type['display_name'])], limit=1
-        )
-        if not leave_type_obj:
-            leave_type_obj = request.env['hr.leave.type'].sudo().create({
-                'name': leave_type['display_name']
-            })
-
-        # Search again to avoid duplicates
-        existing_tracker = request.env['hr.leave.tracker'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('leave_type_name', '=', leave_type['display_name']),
-            ('year', '=', year)
-        ], limit=1)
-
-        if existing_tracker:
-            # Return existing tracker data with total_dynamic for Annual Leave
-            result = {
-                'total': existing_tracker.total_allocation or 0,
-                'taken': existing_tracker.taken_leaves or 0,
-                'available': existing_tracker.current_balance or 0,
-                'pending': existing_tracker.pending_requests or 0,
-                'carried_forward': getattr(existing_tracker, 'annual_carry', 0),
-                'expired_carried': getattr(existing_tracker, 'expired_carry', 0),
-            }
-            
-            # Add total_dynamic for Annual Leave
-            if leave_type['display_name'] == 'Annual Leave' and balance.get('total_dynamic'):
-                result['total_dynamic'] = balance['total_dynamic']
-                
-            return result
-
-        # Create the record
-        tracker_data = {
-            'employee_id': employee.id,
-            'leave_type_id': leave_type_obj.id,
-            'leave_type_name': leave_type['display_name'],
-            'year': year,
-            'total_allocation': balance['total'],  # This is the static base allocation
-            'taken_leaves': balance['taken'],
-            'pending_requests': balance['pending'],
-            'current_balance': balance['available'],
-            'employee_name': employee.name,
-            'employee_number': employee.employee_number or '',
-            'name': f"{leave_type['display_name']} {year}",
-            'department_id': employee.department_id.id if employee.department_id else False,
-            'annual_carry': balance.get('carried_forward', 0),
-            'expired_carry': balance.get('expired_carried', 0),
-            'create_uid': request.env.user.id,
-            'write_uid': request.env.user.id
-        }
-
-        # Add historical flag if your model supports it
-        if hasattr(request.env['hr.leave.tracker'], 'is_historical'):
-            tracker_data['is_historical'] = is_historical_year
-
-        _logger.info(
-            f"Creating new tracker record for {employee.name} - {leave_type['display_name']} "
-            f"- Year: {year} - Historical: {is_historical_year}"
-        )
-
-        request.env['hr.leave.tracker'].sudo().create(tracker_data)
-
-        # Return the balance dict with total_dynamic for Annual Leave
-        result = {
-            'total': balance['total'],  # Static allocation
-            'taken': balance['taken'],
-            'available': balance['available'],
-            'pending': balance['pending'],
-            'carried_forward': balance.get('carried_forward', 0),
-            'expired_carried': balance.get('expired_carried', 0),
-        }
-        
-        # Add total_dynamic for Annual Leave
-        if leave_type['display_name'] == 'Annual Leave' and balance.get('total_dynamic'):
-            result['total_dynamic'] = balance['total_dynamic']
-            
-        return result
-
-    def _calculate_default_leave_balance(self, leave_type, employee, today):
-        """Calculate leave balance using default logic when no tracker record exists"""
-        current_year = today.year
-        gender = (employee.gender or '').lower()
-        marital_status = (employee.marital or '').lower()
-        join_date = employee.join_date
-        service_months = 0
-        if join_date:
-            delta = relativedelta(today, join_date)
-            service_months = delta.years * 12 + delta.months
-
-        if leave_type == 'Casual Leave':
-            return self._calculate_casual_leave_accrual(employee, today)
-
-        elif leave_type == 'Annual Leave' and service_months >= 12:
-            return self._calculate_annual_leave_accrual(employee, today)
-
-        elif leave_type == 'Medical Leave' and service_months >= 6:
-            return self._calculate_fixed_leave(30, employee.id, leave_type, current_year)
-
-        elif leave_type == 'Funeral Leave':
-            return self._calculate_lifetime_leave(7, employee.id, leave_type)
-
-        elif leave_type == 'Marriage Leave' and marital_status == 'single' and service_months >= 12:
-            return self._calculate_lifetime_leave(5, employee.id, leave_type)
-
-        elif leave_type == 'Unpaid Leave':
-            return self._calculate_fixed_leave(30, employee.id, leave_type, current_year)
-
-        elif leave_type == 'Maternity Leave' and marital_status == 'married' and gender == 'female':
-            return self._calculate_lifetime_leave(98, employee.id, leave_type)
-
-        elif leave_type == 'Paternity Leave' and marital_status == 'married' and gender == 'male':
-            return self._calculate_lifetime_leave(15, employee.id, leave_type)
-
-        else:
-            # If not eligible, return empty balance
-            return {'total': 0, 'taken': 0, 'available': 0, 'pending': 0,
-                    'carried_forward': 0, 'expired_carried': 0}
-
-    
-    def _calculate_casual_leave_accrual(self, employee, today):
-        current_year = today.year
-        permanent_date = self._get_permanent_date(employee)
-        _logger.info('Permanent date %s', permanent_date)
-
-        if not permanent_date or today < permanent_date:
-            return {'total': 0, 'taken': 0, 'available': 0, 'pending': 0, 'carried_forward': 0, 'expired_carried': 0}
-
-        if permanent_date.year < current_year:
-            total_casual = 12 * 0.5  # Full year allocation
-        elif permanent_date.year == current_year:
-            if today >= permanent_date:
-                # Accrue from permanent month (inclusive) through December (inclusive)
-                # Example: permanent_date = 2025-08-26 -> months = 5 (Aug, Sep, Oct, Nov, Dec)
-                months = 12 - permanent_date.month + 1
-                total_casual = months * 0.5
-            else:
-                total_casual = 0  # Not eligible until permanent date
-        else:
-            total_casual = 0
-
-        taken = self._get_actual_taken_leaves(employee.id, 'Casual Leave', current_year)
-        pending = self._get_actual_pending_leaves(employee.id, 'Casual Leave', current_year)
-        available = max(total_casual - taken, 0)
-
-        return {
-            'total': total_casual,
-            'taken': taken,
-            'available': available,
-            'pending': pending,
-            'carried_forward': 0,
-            'expired_carried': 0
-        }
-    
-    def _count_accrued_months(self, start_date, today):
-        """Count full months from start_date up to today."""
-        months = (today.year - start_date.year) * 12 + (today.month - start_date.month)
-        last_day_of_month = (date(today.year, today.month, 1) + relativedelta(months=1)) - timedelta(days=1)
-        if today == last_day_of_month:
-            months += 1
-        return max(0, months)
-
-    def _calculate_annual_leave_accrual(self, employee, today):
-        """Calculate annual leave accrual for an employee and store total_dynamic in tracker"""
-        current_year = today.year
-        join_date = getattr(employee, 'join_date', None)
-
-        # --- Initialize all return variables to avoid UnboundLocalError ---
-        total = 0
-        total_dynamic = 0
-        accrued_new = 0
-        final_taken = 0
-        available = 0
-        pending = 0
-        resp_carried = 0
-        resp_expired = 0
-
-        if not join_date:
-            return {
-                'total': total,
-                'total_dynamic': total_dynamic,
-                'accrued_new': accrued_new,
-                'taken': final_taken,
-                'system_taken': final_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': resp_carried,
-                'expired_carried': resp_expired,
-            }
-
-        service_date = join_date + relativedelta(years=1)
-        if today < service_date:
-            return {
+                'success': True,
                 'total': total,
-                'total_dynamic': total_dynamic,
-                'accrued_new': accrued_new,
-                'taken': final_taken,
-                'system_taken': final_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': resp_carried,
-                'expired_carried': resp_expired,
-            }
-
-        system_start_date = self._get_system_start_date()
-        cutoff = date(current_year, 6, 30)
-
-        # ---------------- Tracker branch ----------------
-        tracker_domain = [
-            ('employee_id', '=', employee.id),
-            ('leave_type_id.name', 'ilike', 'Annual Leave'),
-            ('year', '=', str(system_start_date.year)),
-        ]
-        if current_year < system_start_date.year:
-            tracker_domain.append(
-                ('create_date', '<=', datetime.combine(system_start_date, datetime.min.time()))
-            )
-
-        tracker = request.env['hr.leave.tracker'].sudo().search(tracker_domain, limit=1)
-
-        if tracker and today.year == system_start_date.year:
-            # Use tracker for accrual
-            accrue_start = max(tracker.create_date.date(), service_date)
-            accrued_new = self._count_accrued_months(accrue_start, today)
-            static_allocation = tracker.total_allocation or 0
-            total_dynamic = static_allocation + accrued_new
-            tracker.sudo().write({'total_dynamic': total_dynamic})
-
-            # Validated leaves
-            validated_leaves = request.env['hr.leave'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('holiday_status_id.name', 'ilike', 'Annual Leave'),
-                ('state', '=', 'validate'),
-                ('request_date_from', '>=', accrue_start),
-                ('request_date_to', '<=', date(current_year, 12, 31)),
-            ])
-            validated_taken = sum(validated_leaves.mapped('number_of_days'))
-            import_taken = getattr(tracker, 'imported_taken', 0)
-
-            if not getattr(tracker, 'import_applied', False):
-                final_taken = (tracker.taken_leaves or 0) + validated_taken + (import_taken or 0)
-                tracker.sudo().write({'import_applied': True})
-            else:
-                final_taken = (tracker.taken_leaves or 0) + validated_taken
-
-            pending = self._get_actual_pending_leaves(employee.id, 'Annual Leave', current_year)
-            available = max(total_dynamic - final_taken, 0)
-
-            # Tracker branch return
-            return {
-                'total': static_allocation,
-                'total_dynamic': total_dynamic,
-                'accrued_new': accrued_new,
-                'taken': validated_taken,
-                # 'system_taken': final_taken,
-                'available': available,
-                'pending': pending,
-                'carried_forward': 0,
-                'expired_carried': 0,
-            }
-
-        # ---------------- System calculation branch (no tracker) ----------------
-        _logger.debug("No tracker found, running system calculation for employee %s", employee.id)
-
-        carry_from_last_year = self._get_carry_forward_from_previous_year(employee, current_year, 'Annual Leave')
-        accrual_start = service_date if today.year == service_date.year else date(today.year, 1, 1)
-        accrued_new = self._count_accrued_months(accrual_start, today)
-
-        validated_leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('holiday_status_id.name', 'ilike', 'Annual Leave'),
-            ('state', '=', 'validate'),
-            ('request_date_from', '>=', accrual_start),
-            ('request_date_to', '<=', date(current_year, 12, 31)),
-        ])
-        total_taken = sum(validated_leaves.mapped('number_of_days'))
-        pending = self._get_actual_pending_leaves(employee.id, 'Annual Leave', current_year)
-
-        if today <= cutoff:
-            # Before cutoff, carry is still active
-            total = carry_from_last_year + accrued_new
-            total_dynamic = total
-            resp_carried = carry_from_last_year
-            resp_expired = 0
-            final_taken = total_taken
-        else:
-            # After cutoff, deduct carry first
-            taken_from_carry = min(carry_from_last_year, total_taken)
-            taken_from_new = total_taken - taken_from_carry
-
-            resp_carried = 0
-            resp_expired = max(carry_from_last_year - total_taken, 0)
-            final_taken = taken_from_new
-
-            total = accrued_new + resp_carried
-            total_dynamic = total
-
-        available = max(total_dynamic - final_taken, 0)
-        _logger.debug(
-            "System calculation: total=%s, total_dynamic=%s, accrued_new=%s, carry_from_last_year=%s, final_taken=%s, available=%s",
-            total, total_dynamic, accrued_new, carry_from_last_year, final_taken, available
-        )
-
-        # Persist system calculation in tracker
-        leave_type = request.env['hr.leave.type'].sudo().search([('name', 'ilike', 'Annual Leave')], limit=1)
-        if leave_type:
-            tracker_vals = {
-                'employee_id': employee.id,
-                'leave_type_id': leave_type.id,
-                'year': str(current_year),
-                'total_allocation': total,
-                'total_dynamic': total_dynamic,
-                'taken_leaves': final_taken,
-                'annual_carry': resp_carried,
-                'expired_carry': resp_expired
+                'offset': offset,
+                'limit': limit,
+                'result': rows,
             }
-            tracker_rec = request.env['hr.leave.tracker'].sudo().search([
-                ('employee_id', '=', employee.id),
-                ('leave_type_id', '=', leave_type.id),
-                ('year', '=', str(current_year))
-            ], limit=1)
-            if tracker_rec:
-                tracker_rec.sudo().write(tracker_vals)
-            else:
-                request.env['hr.leave.tracker'].sudo().create(tracker_vals)
-
-        return {
-            'total': total,
-            'total_dynamic': total_dynamic,
-            'accrued_new': accrued_new,
-            'taken': total_taken,
-            'system_taken': final_taken,
-            'available': available,
-            'pending': pending,
-            'carried_forward': resp_carried,
-            'expired_carried': resp_expired,
-        }
-
-
-
-    def _calculate_monthly_accrual(self, start_date, end_date, accrual_per_month=1.0):
-        """
-        Count full months from start_date up to last completed month before end_date.
-        Include the month of start_date if it is completed.
-        """
-        if start_date > end_date:
-            return 0
-
-        # Calculate months from start_date to end_date
-        months = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month)
-        
-        # Add partial month accrual based on day completion
-        if end_date.day >= start_date.day:
-            months += 1
-        
-        return max(months * accrual_per_month, 0)
 
-    def _calculate_previous_year_allocation(self, employee, year):
-        """Calculate what the allocation should have been for a previous year"""
-        permanent_date = self._get_permanent_date(employee)
-        if not permanent_date:
-            return 0
-        
-        if year < permanent_date.year:
-            return 0
-        elif year == permanent_date.year:
-            # Pro-rated allocation based on permanent month
-            return 12 - permanent_date.month + 1
-        else:
-            # Full year allocation (12 months)
-            return 12
-
-    def _calculate_fixed_leave(self, total_allocation, employee_id, leave_type, year):
-        """Calculate fixed annual allocation leaves (medical, unpaid)"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-        
-        leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('request_date_from', '>=', start_of_year),
-            ('request_date_to', '<=', end_of_year),
-            ('state', '=', 'validate'),
-        ])
-        taken = sum(leaves.mapped('number_of_days'))
-
-        pending_leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('request_date_from', '>=', start_of_year),
-            ('request_date_to', '<=', end_of_year),
-            ('state', '=', 'confirm'),
-        ])
-        pending = sum(pending_leaves.mapped('number_of_days'))
-        _logger.debug("Fixed leave calculation for %s: total=%s, taken=%s, pending=%s ,available=%s", leave_type, total_allocation, taken, pending, max(total_allocation - taken, 0))
-
-        return {
-            'total': total_allocation,
-            'taken': taken,
-            'available': max(total_allocation - taken, 0),
-            'pending': pending,
-            'carried_forward': 0,
-            'expired_carried': 0
-        }
-
-    def _calculate_lifetime_leave(self, total_allocation, employee_id, leave_type):
-        """Calculate lifetime allocation leaves (funeral, marriage, maternity, paternity)"""
-        leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'validate'),
-        ])
-        taken = sum(leaves.mapped('number_of_days'))
-
-        pending_leaves = request.env['hr.leave'].sudo().search([
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'confirm'),
-        ])
-        pending = sum(pending_leaves.mapped('number_of_days'))
-        _logger.debug("Lifetime leave taken: %s, pending: %s", taken, pending)
-
-        return {
-            'total': total_allocation,
-            'taken': taken,
-            'available': max(total_allocation - taken, 0),
-            'pending': pending,
-            'carried_forward': 0,
-            'expired_carried': 0
-        }
-
-    def _get_actual_taken_leaves(self, employee_id, leave_type, year):
-        """Get actual taken leaves from hr_leave table"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-
-        domain = [
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'validate')
-        ]
-        
-        # For lifetime leaves, don't filter by year
-        if leave_type not in ['Funeral Leave', 'Marriage Leave', 'Maternity Leave', 'Paternity Leave']:
-            domain += [('request_date_from', '>=', start_of_year), ('request_date_to', '<=', end_of_year)]
-
-        leaves = request.env['hr.leave'].sudo().search(domain)
-        taken = sum(leaves.mapped('number_of_days'))
-        
-        _logger.info(f"Actual taken leaves for {leave_type} in {year}: {taken}")
-        return taken
-
-    def _get_actual_pending_leaves(self, employee_id, leave_type, year):
-        """Get actual pending leaves from hr_leave table"""
-        start_of_year = date(year, 1, 1)
-        end_of_year = date(year, 12, 31)
-
-        domain = [
-            ('employee_id', '=', employee_id),
-            ('holiday_status_id.name', 'ilike', leave_type),
-            ('state', '=', 'confirm')
-        ]
-        
-        # For lifetime leaves, don't filter by year
-        if leave_type not in ['Funeral Leave', 'Marriage Leave', 'Maternity Leave', 'Paternity Leave']:
-            domain += [('request_date_from', '>=', start_of_year), ('request_date_to', '<=', end_of_year)]
-
-        leaves = request.env['hr.leave'].sudo().search(domain)
-        pending = sum(leaves.mapped('number_of_days'))
-        
-        _logger.info(f"Actual pending leaves for {leave_type} in {year}: {pending}")
-        return pending
\ No newline at end of file
+        except Exception as e:
+            _logger.exception("Error in get_leave_balance_batch")
+            return {'success': False, 'error': str(e)}
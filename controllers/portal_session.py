@@ -0,0 +1,60 @@
+from odoo import fields
+from odoo.http import request
+
+# Session key of the cached employee context, next to 'employee_number' (the hr.employee id)
+PORTAL_EMPLOYEE_KEY = 'portal_employee'
+
+
+def build_employee_context(employee):
+    """Plain, session-storable values of ``employee`` used by the portal routes"""
+    return {
+        'id': employee.id,
+        'employee_number': employee.employee_number or '',
+        'name': employee.name,
+        'department': employee.department_id.name or '',
+        'gender': employee.gender or '',
+        'marital': employee.marital or '',
+        'join_date': fields.Date.to_string(employee.join_date),
+        'permanent_date': fields.Date.to_string(employee.permanent_date) if 'permanent_date' in employee._fields else False,
+        'tags': employee.category_ids.mapped('name'),
+        # With microseconds: two writes within one second must not look alike
+        'write_date': employee.write_date and employee.write_date.isoformat(),
+    }
+
+
+def set_portal_employee(employee):
+    """Log ``employee`` in the portal session and cache its context"""
+    request.session['employee_number'] = employee.id
+    request.session[PORTAL_EMPLOYEE_KEY] = build_employee_context(employee)
+
+
+def get_portal_employee_context():
+    """Context of the session employee, or None when nobody is logged in.
+
+    The cached context is checked against the employee's ``write_date`` with
+    one primary key lookup and rebuilt only when the employee changed.
+    """
+    employee_id = request.session.get('employee_number')
+    if not employee_id:
+        return None
+    context = request.session.get(PORTAL_EMPLOYEE_KEY)
+
+    request.env.cr.execute("SELECT write_date FROM hr_employee WHERE id = %s AND active", (int(employee_id),))
+    row = request.env.cr.fetchone()
+    if not row:
+        request.session.pop(PORTAL_EMPLOYEE_KEY, None)
+        return None
+    write_date = row[0] and row[0].isoformat()
+    if context and context['id'] == int(employee_id) and context['write_date'] == write_date:
+        return context
+
+    employee = request.env['hr.employee'].sudo().browse(int(employee_id))
+    context = dict(build_employee_context(employee), write_date=write_date)
+    request.session[PORTAL_EMPLOYEE_KEY] = context
+    return context
+
+
+def get_portal_employee():
+    """The session employee as a sudo record (read lazily), or an empty recordset"""
+    context = get_portal_employee_context()
+    return request.env['hr.employee'].sudo().browse(context['id'] if context else [])
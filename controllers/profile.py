@@ -1,9 +1,19 @@
-from odoo import http
-from odoo.http import request
+from odoo import fields, http
+from odoo.http import request, Response
 import logging
 from datetime import datetime 
+
+from ..models.hr_employee import PORTAL_PHOTO_SIZES
+from .portal_session import get_portal_employee, set_portal_employee
+
 _logger = logging.getLogger(__name__)
 
+# Photo URLs change with the photo, so they never need revalidation
+PHOTO_MAX_AGE = 365 * 24 * 3600
+
+# Same for the versioned reference data URL
+REFERENCE_DATA_MAX_AGE = 365 * 24 * 3600
+
 class EmployeePortal(http.Controller):
 
     @http.route('/employee/register', type='http', auth='public', website=True, methods=['GET', 'POST'], csrf=False)
@@ -16,7 +26,7 @@ class EmployeePortal(http.Controller):
             new_password = kwargs.get('new_password')
             forgot = kwargs.get('forgot')
 
-            employee = request.env['hr.employee'].sudo().search([('employee_number', '=', input_emp_id)], limit=1)
+            employee = request.env['hr.employee'].sudo()._get_employee_by_number(input_emp_id)
 
             _logger.info("Incoming employee data: %s", employee)
             if not employee:
@@ -35,7 +45,7 @@ class EmployeePortal(http.Controller):
                     'employee_number': employee.id,
                     'password': password
                 })
-                request.session['employee_number'] = employee.id
+                set_portal_employee(employee)
                 return request.redirect('/employee/profile')
 
             if forgot:
@@ -55,7 +65,7 @@ class EmployeePortal(http.Controller):
             else:
                 # User is trying to login
                 if login_record.password == password:
-                    request.session['employee_number'] = employee.id
+                    set_portal_employee(employee)
                     return request.redirect('/employee/profile')
                 else:
                     # Correct ID but wrong password, show noti, do NOT show reset template
@@ -76,30 +86,79 @@ class EmployeePortal(http.Controller):
 
     @http.route('/employee/profile', type='http', auth='public', website=True)
     def employee_profile(self, **kwargs):
-        employee_number = request.session.get('employee_number')
-
-        if not employee_number:
+        if not request.session.get('employee_number'):
             return request.redirect('/employee/register')
 
-        employee = request.env['hr.employee'].sudo().browse(employee_number)
-        if not employee.exists():
+        employee = get_portal_employee()
+        if not employee:
             return request.not_found()
 
+        # Photo variants by URL so the browser caches them instead of inlining image_1920
+        photo_urls = {
+            size: '/employee/photo/%s/%s/%s' % (employee.id, size, attachment.checksum)
+            for size, attachment in employee._get_photo_attachments().items()
+        }
+        _payload, version = request.env['hr.employee'].sudo()._get_portal_reference_data()
         return request.render('custom_leave_request.employee_profile_template', {
             'employee': employee,
+            'photo_urls': photo_urls,
+            'reference_data_url': '/employee/reference-data?v=%s' % version,
         })
 
+    @http.route('/employee/reference-data', type='http', auth='public', methods=['GET'])
+    def employee_reference_data(self, v=None, **kwargs):
+        """Countries, selection values and leave types of the portal forms.
+
+        The URL the pages link to carries the content version, so a response
+        for the current version is cached for good; other requests revalidate
+        with the ETag.
+        """
+        payload, version = request.env['hr.employee'].sudo()._get_portal_reference_data()
+        if v == version:
+            cache_control = 'public, max-age=%s, immutable' % REFERENCE_DATA_MAX_AGE
+        else:
+            cache_control = 'public, no-cache'
+        headers = [
+            ('Cache-Control', cache_control),
+            ('ETag', '"%s"' % version),
+        ]
+        if version in request.httprequest.if_none_match:
+            return Response(status=304, headers=headers)
+        return request.make_response(payload, headers=headers + [
+            ('Content-Type', 'application/json'),
+        ])
+
+    @http.route('/employee/photo/<int:employee_id>/<int:size>/<string:checksum>', type='http', auth='public')
+    def employee_photo(self, employee_id, size, checksum, **kwargs):
+        """Resized employee photo; the content checksum in the URL makes it cacheable forever"""
+        if size not in PORTAL_PHOTO_SIZES:
+            return request.not_found()
+        employee = request.env['hr.employee'].sudo().browse(employee_id).exists()
+        attachment = employee and employee._get_photo_attachments([size]).get(size)
+        if not attachment or attachment.checksum != checksum:
+            return request.not_found()
+
+        headers = [
+            ('Cache-Control', 'public, max-age=%s, immutable' % PHOTO_MAX_AGE),
+            ('ETag', '"%s"' % checksum),
+        ]
+        if checksum in request.httprequest.if_none_match:
+            return Response(status=304, headers=headers)
+        return request.make_response(attachment.raw, headers=headers + [
+            ('Content-Type', attachment.mimetype or 'image/png'),
+            ('Content-Length', attachment.file_size),
+        ])
+
 
     @http.route('/employee/profile/update', type='json', auth='public', methods=['POST'], csrf=False)
     def update_employee_profile(self):
         post = request.jsonrequest
         try:
-            employee_number = request.session.get('employee_number')
-            if not employee_number:
+            if not request.session.get('employee_number'):
                 return {'success': False, 'error': 'Not logged in or session expired.'}
 
-            employee = request.env['hr.employee'].sudo().browse(employee_number)
-            if not employee.exists():
+            employee = get_portal_employee()
+            if not employee:
                 return {'success': False, 'error': 'Employee record not found.'}
 
 
@@ -122,11 +181,11 @@ class EmployeePortal(http.Controller):
                 if post.get('permit_no'):
                     values['permit_no'] = post.get('permit_no')
 
-                # Nationality (country_id) - resolve by name
+                # Nationality (country_id) - an id from the reference data, names from older pages
                 if post.get('country_id'):
-                    country = request.env['res.country'].sudo().search([('name', '=', post.get('country_id'))], limit=1)
-                    if country:
-                        values['country_id'] = country.id
+                    country_id = request.env['res.country'].sudo()._resolve_portal_country(post.get('country_id'))
+                    if country_id:
+                        values['country_id'] = country_id
 
                 # Birthday (date)
                 if post.get('birthday'):
@@ -153,34 +212,28 @@ class EmployeePortal(http.Controller):
                 if post.get('work_email'):
                     values['work_email'] = post.get('work_email')
 
-            if values:
-                employee.sudo().write(values)
-                request.env.cr.commit()
-                _logger.info("Profile updated for employee: %s", employee.name)
-            else:
-                _logger.info("No fields to update for employee: %s", employee.name)
-
-            # Prepare updated data for frontend refresh
-            updated_data = {
-                'name': employee.name or '',
-                'gender': employee.gender or '',
-                'birthday': employee.birthday.strftime('%Y-%m-%d') if employee.birthday else '',
-                'nrc_full': employee.nrc_full or '',
-                'marital': employee.marital or '',
-                'permit_no': employee.permit_no or '',
-                'country_id': employee.country_id.name if employee.country_id else '',
-                'certificate': employee.certificate or '',
-                'study_field': employee.study_field or '',
-                'personal_phone': employee.personal_phone or '',
-                'personal_email': employee.personal_email or '',
-                'home_address': employee.home_address or '',
-                'job_title': employee.job_title or '',
-                'work_email': employee.work_email or '',
+            # Write only what differs from the record, and send back only that
+            changed = {
+                field: value for field, value in values.items()
+                if (employee[field].id if field == 'country_id' else employee[field]) != value
             }
+            if changed:
+                employee.write(changed)
+                _logger.info("Profile updated for employee %s: %s", employee.id, sorted(changed))
+            else:
+                _logger.info("No profile changes for employee: %s", employee.id)
+
+            updated_data = {}
+            for field, value in changed.items():
+                if field == 'country_id':
+                    updated_data['country_id.name'] = employee.country_id.name
+                elif field == 'birthday':
+                    value = fields.Date.to_string(value)
+                updated_data[field] = value
 
             return {
                 'success': True,
-                'message': 'Profile updated successfully',
+                'message': 'Profile updated successfully' if changed else 'Profile is already up to date',
                 'updated_data': updated_data
             }
 
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import psycopg2
+
+from odoo.tools import str2bool
+from odoo.tools.sql import column_exists, table_exists
+
+_logger = logging.getLogger(__name__)
+
+# Leaves that count for balances and overlap checks
+OPEN_LEAVE_STATES = "state IN ('confirm', 'validate')"
+
+# (index name, table, column list, partial index predicate) for the hot portal lookups
+LEAVE_INDEXES = [
+    # Overlap/adjacency checks and "my requests" lists of one employee
+    ('hr_leave_employee_state_dates_index', 'hr_leave',
+     'employee_id, state, request_date_from, request_date_to', None),
+    ('hr_leave_employee_open_dates_index', 'hr_leave',
+     'employee_id, request_date_from, request_date_to', OPEN_LEAVE_STATES),
+    # Keyset pages of an employee's leave history, newest first
+    ('hr_leave_employee_create_date_index', 'hr_leave', 'employee_id, create_date DESC, id DESC', None),
+    # Balance sums grouped by employee and leave type
+    ('hr_leave_employee_open_type_index', 'hr_leave',
+     'employee_id, holiday_status_id, request_date_from', OPEN_LEAVE_STATES),
+    # Tracker lookups and incremental updates
+    ('hr_leave_tracker_employee_type_year_index', 'hr_leave_tracker',
+     'employee_id, leave_type_name, year', None),
+    # Portal login and employee resolution by employee number
+    ('hr_employee_employee_number_index', 'hr_employee', 'employee_number', None),
+    ('employee_login_employee_number_index', 'employee_login', 'employee_number', None),
+]
+
+LEAVE_RANGE_INDEX = 'hr_leave_employee_date_range_index'
+
+# Optional exclusion constraint rejecting overlapping approved leaves of one
+# employee, enabled by the REJECT_VALIDATED_OVERLAPS_PARAM system parameter
+VALIDATED_OVERLAP_CONSTRAINT = 'hr_leave_validated_overlap_excl'
+REJECT_VALIDATED_OVERLAPS_PARAM = 'custom_leave_request.reject_validated_overlaps'
+
+
+def create_leave_indexes(cr):
+    """Create the composite and partial indexes of ``LEAVE_INDEXES``.
+
+    Tables and columns provided by modules this one does not depend on (the
+    tracker, ``employee_number`` on hr.employee) are skipped until they exist.
+    """
+    for name, table, columns, where in LEAVE_INDEXES:
+        if not table_exists(cr, table):
+            continue
+        if not all(column_exists(cr, table, column.split()[0]) for column in columns.split(',')):
+            continue
+        cr.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", (name,))
+        if cr.fetchone():
+            continue
+        query = 'CREATE INDEX "%s" ON "%s" (%s)' % (name, table, columns)
+        if where:
+            query += ' WHERE %s' % where
+        cr.execute(query)
+        _logger.info("Created index %s on %s", name, table)
+
+
+def create_leave_range_index(cr):
+    """GiST index on (employee_id, daterange) for the ``&&`` / ``-|-`` overlap queries.
+
+    Needs the btree_gist extension for the ``employee_id`` equality; when it
+    cannot be installed (no superuser rights) the queries still work, only
+    without the index. Also adds the validated overlap constraint when its
+    system parameter is enabled.
+    """
+    if not table_exists(cr, 'hr_leave'):
+        return
+    if not _install_btree_gist(cr):
+        _logger.warning("%s is not created", LEAVE_RANGE_INDEX)
+        return
+    cr.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", (LEAVE_RANGE_INDEX,))
+    if not cr.fetchone():
+        cr.execute("""
+            CREATE INDEX "%s" ON hr_leave
+             USING gist (employee_id, daterange(request_date_from, request_date_to, '[]'))
+             WHERE %s
+        """ % (LEAVE_RANGE_INDEX, OPEN_LEAVE_STATES))
+        _logger.info("Created index %s on hr_leave", LEAVE_RANGE_INDEX)
+
+    if table_exists(cr, 'ir_config_parameter'):
+        cr.execute("SELECT value FROM ir_config_parameter WHERE key = %s", (REJECT_VALIDATED_OVERLAPS_PARAM,))
+        row = cr.fetchone()
+        if row and str2bool(row[0] or 'False', False):
+            set_validated_overlap_constraint(cr, True)
+
+
+def _install_btree_gist(cr):
+    try:
+        with cr.savepoint(flush=False):
+            cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    except psycopg2.Error as e:
+        _logger.warning("Could not install btree_gist: %s", e)
+        return False
+    return True
+
+
+def set_validated_overlap_constraint(cr, enabled):
+    """Add or drop the exclusion constraint rejecting overlapping approved leaves.
+
+    Returns False when the constraint cannot be added: btree_gist is not
+    available, or approved leaves already overlap.
+    """
+    cr.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", (VALIDATED_OVERLAP_CONSTRAINT,))
+    exists = bool(cr.fetchone())
+    if not enabled:
+        if exists:
+            cr.execute('ALTER TABLE hr_leave DROP CONSTRAINT "%s"' % VALIDATED_OVERLAP_CONSTRAINT)
+            _logger.info("Dropped constraint %s on hr_leave", VALIDATED_OVERLAP_CONSTRAINT)
+        return True
+    if exists:
+        return True
+    if not _install_btree_gist(cr):
+        return False
+    try:
+        with cr.savepoint(flush=False):
+            cr.execute("""
+                ALTER TABLE hr_leave ADD CONSTRAINT "%s"
+                EXCLUDE USING gist (employee_id WITH =, daterange(request_date_from, request_date_to, '[]') WITH &&)
+                WHERE (state = 'validate' AND active)
+            """ % VALIDATED_OVERLAP_CONSTRAINT)
+    except psycopg2.Error as e:
+        _logger.warning("Could not add constraint %s: %s", VALIDATED_OVERLAP_CONSTRAINT, e)
+        return False
+    _logger.info("Added constraint %s on hr_leave", VALIDATED_OVERLAP_CONSTRAINT)
+    return True
+
+
+def post_init_hook(cr, registry):
+    create_leave_indexes(cr)
+    create_leave_range_index(cr)
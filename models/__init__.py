@@ -1,3 +1,16 @@
 # -*- coding: utf-8 -*-
 
-from . import employee_login
\ No newline at end of file
+from . import employee_login
+from . import hr_employee
+from . import hr_leave
+from . import hr_leave_type
+from . import ir_attachment
+from . import ir_config_parameter
+from . import leave_attachment_upload
+from . import leave_balance
+from . import leave_balance_cache
+from . import leave_import
+from . import leave_notification_job
+from . import leave_request_idempotency
+from . import res_country
+from . import resource_calendar
\ No newline at end of file
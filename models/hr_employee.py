@@ -0,0 +1,135 @@
+import hashlib
+import json
+
+from odoo import api, models, tools
+
+from .leave_balance import LEAVE_TYPES, LIFETIME_LEAVE_TYPES
+from .leave_balance_cache import EMPLOYEE_BALANCE_FIELDS
+
+# Photo variants served to the portal (image_128 / image_256 of image.mixin)
+PORTAL_PHOTO_SIZES = (128, 256)
+
+# Selection fields whose values the portal profile forms offer
+PORTAL_SELECTION_FIELDS = ['gender', 'marital']
+
+# hr.employee fields the employee number -> id map depends on
+EMPLOYEE_NUMBER_FIELDS = {'employee_number', 'active'}
+
+
+class UnknownEmployeeNumber(Exception):
+    """Raised by the cached employee number lookup so that misses are not cached"""
+
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if EMPLOYEE_BALANCE_FIELDS.intersection(vals):
+            self.env['hr.leave.balance.cache'].sudo()._invalidate(self.ids)
+        if EMPLOYEE_NUMBER_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
+
+    def _get_leave_calendar(self):
+        """Working calendar leave durations are counted on"""
+        self.ensure_one()
+        return self.resource_calendar_id or self.company_id.resource_calendar_id
+
+    def _count_leave_days(self, date_from, date_to):
+        """Leave days from ``date_from`` to ``date_to`` included: working days of the calendar, public holidays excluded"""
+        working_calendar = self._get_leave_calendar()
+        if not working_calendar:
+            return (date_to - date_from).days + 1
+        return max(working_calendar._count_working_days(date_from, date_to), 0)
+
+    @tools.ormcache('employee_number')
+    def _get_cached_employee_id(self, employee_number):
+        employee_id = self.sudo().search([('employee_number', '=', employee_number)], limit=1).id
+        if not employee_id:
+            raise UnknownEmployeeNumber(employee_number)
+        return employee_id
+
+    def _get_id_by_employee_number(self, employee_number):
+        """Id of the active employee with ``employee_number`` (0 if none).
+
+        Only hits are cached per worker, so creating an employee does not
+        have to clear the registry caches.
+        """
+        try:
+            return self._get_cached_employee_id(employee_number)
+        except UnknownEmployeeNumber:
+            return 0
+
+    @api.model
+    def _get_employee_by_number(self, employee_number):
+        """Active employee with the employee number ``employee_number``, or an empty recordset"""
+        employee_number = str(employee_number or '').strip()
+        return self.browse(employee_number and self._get_id_by_employee_number(employee_number) or [])
+
+    @api.model
+    def _resolve_portal_employee(self, identifier):
+        """Active employee for a portal identifier, or an empty recordset.
+
+        An int is an hr.employee id (the session value); a string is an
+        employee number (the value the portal forms send), resolved through
+        the cached number -> id map. A digit-only string that is no employee
+        number is taken as an id, so both kinds of values keep working.
+        Each case hits a single index instead of OR-ing id and number.
+        """
+        if isinstance(identifier, int) and not isinstance(identifier, bool):
+            return self.search([('id', '=', identifier)], limit=1)
+        employee = self._get_employee_by_number(identifier)
+        identifier = str(identifier or '').strip()
+        if not employee and identifier.isdigit():
+            employee = self.search([('id', '=', int(identifier))], limit=1)
+        return employee
+
+    def action_recompute_leave_trackers(self):
+        """Recompute the leave trackers of the selected employees"""
+        self.env['hr.leave.balance'].sudo()._recompute_trackers(self)
+        return True
+
+    def _get_photo_attachments(self, sizes=PORTAL_PHOTO_SIZES):
+        """Attachments storing the resized variants of the employee photo, by size.
+
+        Their checksum is the content hash of each variant, which the portal
+        uses in the photo URLs.
+        """
+        self.ensure_one()
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', 'hr.employee'),
+            ('res_field', 'in', ['image_%s' % size for size in sizes]),
+            ('res_id', '=', self.id),
+        ])
+        return {int(attachment.res_field.split('_')[1]): attachment for attachment in attachments}
+
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _get_portal_reference_data(self):
+        """Reference data of the portal forms as ``(json, version)``, cached per registry and language.
+
+        Countries, the gender and marital selections and the policy leave
+        types change rarely; ``version`` is a hash of the content, so the
+        portal can cache it for as long as the version it links to holds.
+        Country and leave type changes clear the registry caches.
+        """
+        selections = self.fields_get(PORTAL_SELECTION_FIELDS, ['selection'])
+        _type_ids, exact_ids = self.env['hr.leave.type']._get_policy_type_map()
+        data = {
+            'countries': self.env['res.country']._get_portal_countries(),
+            'selections': {name: selections[name]['selection'] for name in PORTAL_SELECTION_FIELDS},
+            'leave_types': [{
+                'id': exact_ids[leave_type['display_name']],
+                'name': leave_type['name'],
+                'display_name': leave_type['display_name'],
+                'lifetime': leave_type['display_name'] in LIFETIME_LEAVE_TYPES,
+            } for leave_type in LEAVE_TYPES],
+        }
+        payload = json.dumps(data, sort_keys=True)
+        return payload, hashlib.sha1(payload.encode()).hexdigest()[:16]
@@ -0,0 +1,321 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+import psycopg2
+
+from odoo import _, api, fields, models
+from odoo.exceptions import ValidationError
+from odoo.tools import str2bool
+
+from ..hooks import (
+    REJECT_VALIDATED_OVERLAPS_PARAM, VALIDATED_OVERLAP_CONSTRAINT, create_leave_indexes, create_leave_range_index,
+)
+from .leave_balance import LIFETIME_LEAVE_TYPES
+from .leave_balance_cache import LEAVE_BALANCE_FIELDS
+
+# Leave history pages of the portal
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+# Day codes of _get_taken_day_runs(), approved days win over pending ones
+TAKEN_DAY_CODES = {'confirm': 1, 'validate': 2}
+
+# Approved (by default) leaves of an employee overlapping or adjacent to a
+# date range, see HrLeave._get_range_conflicts; shared with the index benchmark
+RANGE_CONFLICTS_QUERY = """
+    SELECT id, request_date_from, request_date_to, holiday_status_id,
+           daterange(request_date_from, request_date_to, '[]') && requested.period AS overlaps
+      FROM hr_leave,
+           (SELECT daterange(%(date_from)s, %(date_to)s, '[]') AS period) AS requested
+     WHERE employee_id = %(employee_id)s
+       AND state IN %(states)s
+       AND active
+       AND id != ALL(%(exclude_ids)s::int[])
+       AND (daterange(request_date_from, request_date_to, '[]') && requested.period
+            OR daterange(request_date_from, request_date_to, '[]') -|- requested.period)
+  ORDER BY request_date_from
+"""
+
+# Incremental tracker update of HrLeave._update_trackers; shared with the index benchmark
+TRACKER_DELTA_QUERY = """
+    UPDATE {table}
+       SET taken_leaves = COALESCE(taken_leaves, 0) + %(taken)s,
+           pending_requests = COALESCE(pending_requests, 0) + %(pending)s,
+           current_balance = COALESCE(current_balance, 0) - %(taken)s,
+           write_uid = %(uid)s,
+           write_date = now() AT TIME ZONE 'UTC'
+     WHERE employee_id = %(employee_id)s
+       AND leave_type_name = %(leave_type)s
+       AND year = %(year)s
+ RETURNING id
+"""
+
+
+class HrLeave(models.Model):
+    _inherit = 'hr.leave'
+
+    def init(self):
+        # Also on module update, for tables of modules installed after this one
+        create_leave_indexes(self.env.cr)
+        create_leave_range_index(self.env.cr)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Types without validation are approved inside create(); skip the
+        # deltas of that nested write and count the final state once below
+        leaves = super(HrLeave, self.with_context(leave_skip_tracker_update=True)).create(vals_list)
+        leaves = leaves.with_env(self.env)
+        if self.env.context.get('leave_skip_tracker_update'):
+            # Bulk imports recompute the trackers once at the end
+            return leaves
+        self.env['hr.leave.balance.cache'].sudo()._invalidate(leaves.employee_id.ids)
+        leaves._update_trackers(leaves._get_tracker_deltas(1))
+        return leaves
+
+    def write(self, vals):
+        # Approve/refuse/reset all go through write() with a new state
+        if not LEAVE_BALANCE_FIELDS.intersection(vals) or self.env.context.get('leave_skip_tracker_update'):
+            return super().write(vals)
+        employee_ids = self.employee_id.ids
+        deltas = self._get_tracker_deltas(-1)
+        res = super().write(vals)
+        self.env['hr.leave.balance.cache'].sudo()._invalidate(employee_ids + self.employee_id.ids)
+        self._update_trackers(deltas, self._get_tracker_deltas(1))
+        return res
+
+    def unlink(self):
+        employee_ids = self.employee_id.ids
+        deltas = self._get_tracker_deltas(-1)
+        res = super().unlink()
+        self.env['hr.leave.balance.cache'].sudo()._invalidate(employee_ids)
+        self._update_trackers(deltas)
+        return res
+
+    @api.model
+    def _get_portal_history(self, employee_id, year=None, state=None, holiday_status_id=None,
+                            after=None, limit=HISTORY_PAGE_SIZE):
+        """One page of an employee's leaves, newest first, and totals per state.
+
+        Pages are keyed on ``(create_date, id)``: ``after`` is the cursor of
+        the last leave of the previous page, so any page costs the same
+        whatever the length of the history. Returns ``(leaves, next_cursor,
+        summary)``, ``summary`` mapping each state to its count and days for
+        the filtered history.
+        """
+        domain = [('employee_id', '=', employee_id)]
+        if year:
+            domain += [('request_date_from', '>=', date(int(year), 1, 1)),
+                       ('request_date_from', '<=', date(int(year), 12, 31))]
+        if state:
+            domain.append(('state', '=', state))
+        if holiday_status_id:
+            domain.append(('holiday_status_id', '=', int(holiday_status_id)))
+
+        summary = {
+            group['state']: {'count': group['__count'], 'days': group['number_of_days']}
+            for group in self.read_group(domain, ['number_of_days:sum'], ['state'], lazy=False)
+        }
+
+        # Row comparison on (create_date, id) with microseconds, matching the
+        # (employee_id, create_date DESC, id DESC) index
+        limit = max(1, min(int(limit or HISTORY_PAGE_SIZE), HISTORY_MAX_PAGE_SIZE))
+        self.flush(['employee_id', 'state', 'request_date_from', 'holiday_status_id'])
+        query = self._where_calc(domain)
+        self._apply_ir_rules(query, 'read')
+        cursor = self._parse_history_cursor(after)
+        if cursor:
+            query.add_where('("hr_leave"."create_date", "hr_leave"."id") < (%s, %s)', list(cursor))
+        query.order = '"hr_leave"."create_date" DESC, "hr_leave"."id" DESC'
+        query.limit = limit + 1
+        query_str, params = query.select('"hr_leave"."id"', '"hr_leave"."create_date"')
+        self.env.cr.execute(query_str, params)
+        rows = self.env.cr.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = '%s,%s' % (rows[-1][1].isoformat(' '), rows[-1][0])
+        return self.browse([leave_id for leave_id, _create_date in rows]), next_cursor, summary
+
+    @api.model
+    def _parse_history_cursor(self, cursor):
+        try:
+            create_date, leave_id = (cursor or '').split(',')
+            return datetime.fromisoformat(create_date), int(leave_id)
+        except ValueError:
+            return None
+
+    @api.model
+    def _get_range_conflicts(self, employee_id, date_from, date_to, states=('validate',), exclude_ids=()):
+        """Leaves of ``employee_id`` overlapping or adjacent to [date_from, date_to].
+
+        Uses the daterange ``&&`` (overlap) and ``-|-`` (adjacent) operators,
+        served by the GiST index of ``create_leave_range_index``. Returns dicts
+        with the leave id, dates, leave type id and whether it ``overlaps``.
+        """
+        self.flush(['employee_id', 'state', 'active', 'request_date_from', 'request_date_to', 'holiday_status_id'])
+        self.env.cr.execute(RANGE_CONFLICTS_QUERY, {
+            'employee_id': employee_id,
+            'date_from': date_from,
+            'date_to': date_to,
+            'states': tuple(states),
+            'exclude_ids': list(exclude_ids),
+        })
+        return self.env.cr.dictfetchall()
+
+    @api.model
+    def _get_taken_day_runs(self, employee_id, date_from, date_to):
+        """Run-length encoded leave days of ``employee_id`` over [date_from, date_to].
+
+        Returns ``[offset, length, code]`` runs, offsets in days from
+        ``date_from``, with code ``TAKEN_DAY_CODES['validate']`` for approved
+        days and ``TAKEN_DAY_CODES['confirm']`` for days only pending approval.
+        Days without leave are left out.
+        """
+        self.flush(['employee_id', 'state', 'active', 'request_date_from', 'request_date_to'])
+        self.env.cr.execute("""
+            SELECT GREATEST(request_date_from, %(date_from)s), LEAST(request_date_to, %(date_to)s), state
+              FROM hr_leave
+             WHERE employee_id = %(employee_id)s
+               AND state IN ('confirm', 'validate')
+               AND active
+               AND daterange(request_date_from, request_date_to, '[]') && daterange(%(date_from)s, %(date_to)s, '[]')
+        """, {'employee_id': employee_id, 'date_from': date_from, 'date_to': date_to})
+
+        days = bytearray((date_to - date_from).days + 1)
+        for start, stop, state in self.env.cr.fetchall():
+            code = TAKEN_DAY_CODES[state]
+            for offset in range((start - date_from).days, (stop - date_from).days + 1):
+                days[offset] = max(days[offset], code)
+
+        runs = []
+        for offset, code in enumerate(days):
+            if not code:
+                continue
+            if runs and runs[-1][2] == code and runs[-1][0] + runs[-1][1] == offset:
+                runs[-1][1] += 1
+            else:
+                runs.append([offset, 1, code])
+        return runs
+
+    @api.constrains('state', 'employee_id', 'request_date_from', 'request_date_to', 'active')
+    def _check_validated_overlap(self):
+        """Optionally reject approving a leave that overlaps another approved leave.
+
+        Enabled by the ``custom_leave_request.reject_validated_overlaps``
+        system parameter, which also adds an exclusion constraint on hr_leave
+        (see hooks.set_validated_overlap_constraint). The leaves are flushed
+        here so the database enforces it: a concurrent approval of an
+        overlapping leave waits for this transaction and then fails on the
+        constraint. Both cases raise the same ValidationError.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        if not str2bool(ICP.get_param(REJECT_VALIDATED_OVERLAPS_PARAM, 'False')):
+            return
+        leaves = self.filtered(lambda leave: leave.state == 'validate' and leave.active and leave.employee_id
+                               and leave.request_date_from and leave.request_date_to)
+        if not leaves:
+            return
+        try:
+            with self.env.cr.savepoint(flush=False):
+                leaves.flush(['state', 'active', 'employee_id', 'request_date_from', 'request_date_to'], leaves)
+        except psycopg2.IntegrityError as e:
+            if e.diag.constraint_name != VALIDATED_OVERLAP_CONSTRAINT:
+                raise
+            raise ValidationError(_(
+                "%(employees)s already has approved leave overlapping these dates.",
+                employees=', '.join(leaves.employee_id.mapped('name')),
+            ))
+        for leave in leaves:
+            conflicts = [
+                conflict for conflict in self._get_range_conflicts(
+                    leave.employee_id.id, leave.request_date_from, leave.request_date_to, exclude_ids=leave.ids)
+                if conflict['overlaps']
+            ]
+            if conflicts:
+                raise ValidationError(_(
+                    "%(employee)s already has approved leave from %(date_from)s to %(date_to)s.",
+                    employee=leave.employee_id.name,
+                    date_from=conflicts[0]['request_date_from'],
+                    date_to=conflicts[0]['request_date_to'],
+                ))
+
+    def _get_tracker_deltas(self, sign):
+        """Signed (taken, pending) days these leaves add to each (employee, leave type, year) tracker.
+
+        Returns ``(deltas, recompute_ids)``: employees whose tracker does not
+        change additively (annual carry/cutoff rules, historical years) are
+        returned in ``recompute_ids`` for a full recompute instead.
+        """
+        deltas = defaultdict(lambda: [0.0, 0.0])
+        recompute_ids = set()
+        if 'hr.leave.tracker' not in self.env:
+            return deltas, recompute_ids
+
+        engine = self.env['hr.leave.balance'].sudo()
+        type_ids, _exact_ids = engine._get_leave_type_map()
+        categories = defaultdict(list)
+        for category, ids in type_ids.items():
+            for type_id in ids:
+                categories[type_id].append(category)
+        today = fields.Date.context_today(self)
+        system_start_year = engine._get_system_start_date().year
+
+        for leave in self.sudo():
+            if not leave.active or leave.state not in ('validate', 'confirm') or not leave.employee_id:
+                continue
+            for category in categories.get(leave.holiday_status_id.id, []):
+                if category in LIFETIME_LEAVE_TYPES:
+                    # Lifetime totals live on the current year's tracker
+                    year = today.year
+                elif leave.request_date_from and leave.request_date_to \
+                        and leave.request_date_from.year == leave.request_date_to.year:
+                    year = leave.request_date_from.year
+                else:
+                    # Leaves spanning two years count in no yearly tracker
+                    continue
+                if category == 'Annual Leave' or year <= system_start_year:
+                    recompute_ids.add(leave.employee_id.id)
+                    continue
+                index = 0 if leave.state == 'validate' else 1
+                deltas[(leave.employee_id.id, category, year)][index] += sign * leave.number_of_days
+        return deltas, recompute_ids
+
+    def _update_trackers(self, *changes):
+        """Apply tracker deltas with atomic increments, recomputing what cannot be applied"""
+        if 'hr.leave.tracker' not in self.env:
+            return
+        Tracker = self.env['hr.leave.tracker'].sudo()
+        deltas = defaultdict(lambda: [0.0, 0.0])
+        recompute_ids = set()
+        for change_deltas, change_recompute_ids in changes:
+            recompute_ids |= change_recompute_ids
+            for key, (taken, pending) in change_deltas.items():
+                deltas[key][0] += taken
+                deltas[key][1] += pending
+
+        Tracker.flush(['taken_leaves', 'pending_requests', 'current_balance'])
+        updated_ids = []
+        for (employee_id, leave_type, year), (taken, pending) in deltas.items():
+            if not taken and not pending:
+                continue
+            self.env.cr.execute(TRACKER_DELTA_QUERY.format(table=Tracker._table), {
+                'taken': taken,
+                'pending': pending,
+                'uid': self.env.uid,
+                'employee_id': employee_id,
+                'leave_type': leave_type,
+                'year': str(year),
+            })
+            ids = [row[0] for row in self.env.cr.fetchall()]
+            if ids:
+                updated_ids += ids
+            else:
+                # No tracker yet: let the recompute create it
+                recompute_ids.add(employee_id)
+        if updated_ids:
+            Tracker.invalidate_cache(['taken_leaves', 'pending_requests', 'current_balance', 'write_date', 'write_uid'], updated_ids)
+
+        if recompute_ids:
+            employees = self.env['hr.employee'].sudo().browse(sorted(recompute_ids)).exists()
+            self.env['hr.leave.balance'].sudo()._recompute_trackers(employees)
@@ -0,0 +1,59 @@
+from odoo import api, models, tools
+
+from .leave_balance import LEAVE_TYPES
+
+
+class HrLeaveType(models.Model):
+    _inherit = 'hr.leave.type'
+
+    @api.model
+    @tools.ormcache()
+    def _get_policy_type_rows(self):
+        """(id, name, active) of every leave type in default order, cached per registry"""
+        leave_types = self.sudo().with_context(active_test=False, lang=None).search([])
+        return tuple((t.id, t.name or '', t.active) for t in leave_types)
+
+    @api.model
+    def _get_policy_type_map(self):
+        """Map each policy leave type to hr.leave.type ids.
+
+        Returns ``(type_ids, exact_ids)``: ``type_ids`` maps each policy name
+        (e.g. "Casual Leave") to the ids of every leave type whose name contains
+        it, archived ones included, like the former ``holiday_status_id.name
+        ilike`` domains did; ``exact_ids`` maps it to the first leave type named
+        exactly like it.
+        """
+        rows = self._get_policy_type_rows()
+        type_ids = {}
+        exact_ids = {}
+        for leave_type in LEAVE_TYPES:
+            name = leave_type['display_name']
+            type_ids[name] = [type_id for type_id, type_name, _active in rows if name.lower() in type_name.lower()]
+            exact_ids[name] = next((type_id for type_id, type_name, _active in rows if type_name == name), False)
+        return type_ids, exact_ids
+
+    @api.model
+    def _get_active_type_ids(self, names):
+        """Ids of the active leave types named exactly like one of ``names``"""
+        return [type_id for type_id, type_name, active in self._get_policy_type_rows() if active and type_name in names]
+
+    def _clear_policy_type_cache(self):
+        self.clear_caches()
+        self.env['hr.leave.balance.cache'].sudo()._invalidate_all()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leave_types = super().create(vals_list)
+        self._clear_policy_type_cache()
+        return leave_types
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'name' in vals or 'active' in vals:
+            self._clear_policy_type_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._clear_policy_type_cache()
+        return res
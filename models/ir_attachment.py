@@ -0,0 +1,148 @@
+import hashlib
+import os
+import uuid
+
+from odoo import _, api, models
+from odoo.exceptions import UserError
+
+# Bytes read/written at a time when streaming uploads
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    @api.model
+    def _get_upload_dir(self):
+        """Filestore directory for files being uploaded, on the same filesystem as the filestore"""
+        path = os.path.join(self._filestore(), 'upload')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @api.model
+    def _create_from_stream(self, stream, vals, max_size):
+        """Create an attachment from a file-like object without loading it in memory.
+
+        The content is copied to the filestore in chunks while its checksum is
+        computed, so there is no base64 round trip through ``datas``. Raises a
+        UserError if the stream is larger than ``max_size`` bytes.
+        """
+        if self._storage() != 'file':
+            # Database storage needs the whole value anyway
+            raw = stream.read(max_size + 1)
+            if len(raw) > max_size:
+                raise UserError(_("The file is too large."))
+            return self.create(dict(vals, raw=raw))
+
+        temp_path = os.path.join(self._get_upload_dir(), uuid.uuid4().hex)
+        sha = hashlib.sha1()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as temp:
+                for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UserError(_("The file is too large."))
+                    sha.update(chunk)
+                    temp.write(chunk)
+            return self._create_from_temp_file(temp_path, sha.hexdigest(), size, vals)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    @api.model
+    def _create_from_file(self, path, vals):
+        """Create an attachment from a complete file under ``_get_upload_dir()``, consuming it"""
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                sha.update(chunk)
+        return self._create_from_temp_file(path, sha.hexdigest(), os.path.getsize(path), vals)
+
+    @api.model
+    def _create_from_temp_file(self, temp_path, checksum, size, vals):
+        """Move ``temp_path`` to its content-addressed filestore location and create the attachment"""
+        fname = checksum[:2] + '/' + checksum
+        full_path = self._full_path(fname)
+        if os.path.exists(full_path):
+            # Same content already stored
+            os.unlink(temp_path)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(temp_path, full_path)
+            # Removed by the filestore garbage collector if the transaction rolls back
+            self._mark_for_gc(fname)
+        return self._create_with_store_fname(fname, checksum, size, vals)
+
+    @api.model
+    def _create_with_store_fname(self, fname, checksum, size, vals):
+        """Create an attachment pointing at an existing filestore file.
+
+        Several attachments may share a file: the filestore garbage collector
+        only removes files no attachment references anymore, which is what
+        keeps unlinking one of them safe.
+        """
+        # create() and write() drop these fields, they are derived from datas
+        attachment = self.create(dict(vals, type='binary'))
+        attachment.flush()
+        self.env.cr.execute("""
+            UPDATE ir_attachment SET store_fname = %s, checksum = %s, file_size = %s WHERE id = %s
+        """, (fname, checksum, size, attachment.id))
+        attachment.invalidate_cache(['store_fname', 'checksum', 'file_size', 'datas', 'raw'], attachment.ids)
+        return attachment
+
+    @api.model
+    def _find_leave_blob(self, employee, checksum):
+        """An attachment with content ``checksum`` already uploaded by ``employee``, if any.
+
+        Limited to the employee's own leaves and uploads so a hash cannot be
+        used to reach somebody else's file.
+        """
+        if self._storage() != 'file':
+            return self.browse()
+        leave_ids = self.env['hr.leave'].sudo().with_context(active_test=False).search([
+            ('employee_id', '=', employee.id),
+        ]).ids
+        upload_ids = self.env['hr.leave.attachment.upload'].sudo().search([
+            ('employee_id', '=', employee.id),
+            ('attachment_id', '!=', False),
+        ]).attachment_id.ids
+        blobs = self.sudo().search([
+            ('checksum', '=', checksum),
+            ('store_fname', '!=', False),
+            '|', '&', ('res_model', '=', 'hr.leave'), ('res_id', 'in', leave_ids),
+            ('id', 'in', upload_ids),
+        ], limit=1, order='id desc')
+        if blobs and os.path.exists(self._full_path(blobs.store_fname)):
+            return blobs
+        return self.browse()
+
+    @api.model
+    def _create_from_blob(self, blob, vals):
+        """New attachment sharing the stored file of ``blob``, nothing is uploaded or copied"""
+        return self._create_with_store_fname(blob.store_fname, blob.checksum, blob.file_size, dict(
+            vals,
+            name=vals.get('name') or blob.name,
+            mimetype=vals.get('mimetype') or blob.mimetype,
+        ))
+
+    @api.model
+    def _get_leave_dedup_stats(self):
+        """Filestore space saved by leave attachments sharing the same file"""
+        self.flush(['res_model', 'store_fname', 'checksum', 'file_size'])
+        self.env.cr.execute("""
+            SELECT count(*), COALESCE(sum(refs), 0), COALESCE(sum(size), 0), COALESCE(sum(size * (refs - 1)), 0)
+              FROM (SELECT store_fname, count(*) AS refs, max(file_size) AS size
+                      FROM ir_attachment
+                     WHERE store_fname IS NOT NULL
+                       AND (res_model = 'hr.leave'
+                            OR id IN (SELECT attachment_id FROM hr_leave_attachment_upload))
+                  GROUP BY store_fname) AS blobs
+        """)
+        blobs, references, stored_bytes, saved_bytes = self.env.cr.fetchone()
+        return {
+            'blobs': blobs,
+            'references': references,
+            'stored_bytes': stored_bytes,
+            'saved_bytes': saved_bytes,
+        }
@@ -0,0 +1,39 @@
+from odoo import _, api, models
+from odoo.exceptions import UserError
+from odoo.tools import str2bool
+
+from ..hooks import REJECT_VALIDATED_OVERLAPS_PARAM, set_validated_overlap_constraint
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        params = super().create(vals_list)
+        params._sync_validated_overlap_constraint()
+        return params
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._sync_validated_overlap_constraint()
+        return res
+
+    def unlink(self):
+        sync = any(param.key == REJECT_VALIDATED_OVERLAPS_PARAM for param in self)
+        res = super().unlink()
+        if sync:
+            set_validated_overlap_constraint(self.env.cr, False)
+        return res
+
+    def _sync_validated_overlap_constraint(self):
+        """Add or drop the hr_leave overlap constraint when its parameter changes"""
+        param = self.filtered(lambda param: param.key == REJECT_VALIDATED_OVERLAPS_PARAM)[:1]
+        if not param:
+            return
+        enabled = str2bool(param.value or 'False', False)
+        self.env['hr.leave'].flush(['employee_id', 'state', 'active', 'request_date_from', 'request_date_to'])
+        if not set_validated_overlap_constraint(self.env.cr, enabled) and enabled:
+            raise UserError(_(
+                "Overlapping approved leaves cannot be rejected yet: approved leaves already overlap, "
+                "or the btree_gist extension is not available. See the server log."))
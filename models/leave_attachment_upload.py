@@ -0,0 +1,169 @@
+import logging
+import os
+import re
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+from .ir_attachment import STREAM_CHUNK_SIZE
+
+_logger = logging.getLogger(__name__)
+
+# Largest leave request attachment
+ATTACHMENT_MAX_SIZE = 25 * 1024 * 1024
+
+# Evidence files accepted by the leave request form (.pdf,.jpg,.jpeg,.png,.doc,.docx)
+ATTACHMENT_MIMETYPES = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+# SHA-1 hex digest, as stored in ir.attachment.checksum
+CHECKSUM_RE = re.compile(r'^[0-9a-f]{40}$')
+
+# Uploads not finished or not attached to a leave within this delay are dropped
+UPLOAD_EXPIRY = timedelta(days=1)
+
+
+def check_attachment_limits(filename, size=None):
+    """Validate an evidence file from its name and announced size, before reading it.
+
+    Returns the mimetype to store; raises a UserError when the file type is
+    not accepted or the file is too large.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in ATTACHMENT_MIMETYPES:
+        raise UserError(_("Only PDF, JPG, PNG and Word files can be attached."))
+    if size is not None and size > ATTACHMENT_MAX_SIZE:
+        raise UserError(_("Attachments cannot be larger than %s MB.", ATTACHMENT_MAX_SIZE // (1024 * 1024)))
+    return ATTACHMENT_MIMETYPES[extension]
+
+
+class LeaveAttachmentUpload(models.Model):
+    """Resumable chunked upload of a leave request attachment.
+
+    The client picks an ``upload_key`` and sends the file in chunks; chunks
+    are appended to a file in the filestore upload directory, and the client
+    can ask how much was received to resume after a dropped connection. Once
+    complete the file becomes an attachment, linked to the leave when the
+    request is submitted.
+    """
+    _name = 'hr.leave.attachment.upload'
+    _description = 'Leave Attachment Upload'
+
+    upload_key = fields.Char(required=True, index=True)
+    employee_id = fields.Many2one('hr.employee', required=True, ondelete='cascade')
+    filename = fields.Char(required=True)
+    mimetype = fields.Char(required=True)
+    total_size = fields.Integer(required=True)
+    received_size = fields.Integer(default=0)
+    attachment_id = fields.Many2one('ir.attachment', ondelete='set null')
+
+    _sql_constraints = [
+        ('upload_key_uniq', 'unique(upload_key)', 'Upload keys must be unique.'),
+    ]
+
+    @api.model
+    def _start(self, employee, upload_key, filename, total_size, checksum=None):
+        """Return the upload ``upload_key`` of ``employee``, creating it if needed.
+
+        With the SHA-1 ``checksum`` of the file, an identical file the employee
+        already uploaded completes the upload at once, without transferring it.
+        """
+        upload = self.search([('upload_key', '=', upload_key)], limit=1)
+        if upload:
+            if upload.employee_id != employee:
+                raise UserError(_("Unknown upload."))
+        else:
+            mimetype = check_attachment_limits(filename, total_size)
+            upload = self.create({
+                'upload_key': upload_key,
+                'employee_id': employee.id,
+                'filename': filename,
+                'mimetype': mimetype,
+                'total_size': total_size,
+            })
+
+        if checksum and not upload.attachment_id and CHECKSUM_RE.match(checksum):
+            Attachment = self.env['ir.attachment'].sudo()
+            blob = Attachment._find_leave_blob(employee, checksum)
+            if blob and blob.file_size == total_size:
+                upload.write({
+                    'attachment_id': Attachment._create_from_blob(blob, {
+                        'name': upload.filename,
+                        'mimetype': upload.mimetype,
+                    }).id,
+                    'received_size': total_size,
+                })
+                _logger.info("Leave attachment upload %s deduplicated (%s bytes)", upload.id, total_size)
+        return upload
+
+    def _get_part_path(self):
+        return os.path.join(self.env['ir.attachment']._get_upload_dir(), 'leave-%s.part' % self.id)
+
+    def _append_chunk(self, offset, stream):
+        """Append the chunk at ``offset``; chunks not at the received size are ignored.
+
+        The client resumes from ``received_size`` so a chunk sent twice (the
+        response of the first attempt was lost) is not written twice.
+        """
+        self.ensure_one()
+        # Serialize concurrent chunks of the same upload
+        self.env.cr.execute("SELECT received_size FROM %s WHERE id = %%s FOR UPDATE" % self._table, (self.id,))
+        received_size = self.env.cr.fetchone()[0]
+        if self.attachment_id:
+            return
+        path = self._get_part_path()
+        # The part file is behind if a transaction that moved or wrote it rolled back
+        stored_size = os.path.getsize(path) if os.path.exists(path) else 0
+        if stored_size < received_size:
+            received_size = self.received_size = stored_size
+        if offset != received_size:
+            return
+
+        with open(path, 'ab') as part:
+            part.truncate(received_size)
+            for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''):
+                received_size += len(chunk)
+                if received_size > self.total_size:
+                    part.truncate(offset)
+                    raise UserError(_("The upload is larger than announced."))
+                part.write(chunk)
+        self.received_size = received_size
+
+        if received_size == self.total_size:
+            self.attachment_id = self.env['ir.attachment'].sudo()._create_from_file(path, {
+                'name': self.filename,
+                'mimetype': self.mimetype,
+            })
+
+    def _attach_to(self, record):
+        """Link the completed upload to ``record`` and drop the upload"""
+        self.ensure_one()
+        if not self.attachment_id:
+            raise UserError(_("The attachment upload is not complete."))
+        self.attachment_id.write({'res_model': record._name, 'res_id': record.id})
+        self.attachment_id = False
+        self.unlink()
+
+    def unlink(self):
+        paths = [upload._get_part_path() for upload in self]
+        attachments = self.attachment_id
+        res = super().unlink()
+        attachments.unlink()
+        for path in paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        return res
+
+    @api.autovacuum
+    def _gc_expired_uploads(self):
+        expired = self.search([('create_date', '<', fields.Datetime.now() - UPLOAD_EXPIRY)])
+        if expired:
+            _logger.info("Dropping %s expired leave attachment uploads", len(expired))
+            expired.unlink()
@@ -0,0 +1,805 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from calendar import monthrange
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools import float_is_zero, split_every
+
+from .leave_accrual import ACCRUAL_KEYS, compute_accruals
+
+_logger = logging.getLogger(__name__)
+
+# Policy leave types reported by the portal, keyed by their short API name
+LEAVE_TYPES = [
+    {'name': 'casual', 'display_name': 'Casual Leave'},
+    {'name': 'annual', 'display_name': 'Annual Leave'},
+    {'name': 'medical', 'display_name': 'Medical Leave'},
+    {'name': 'funeral', 'display_name': 'Funeral Leave'},
+    {'name': 'marriage', 'display_name': 'Marriage Leave'},
+    {'name': 'unpaid', 'display_name': 'Unpaid Leave'},
+    {'name': 'maternity', 'display_name': 'Maternity Leave'},
+    {'name': 'paternity', 'display_name': 'Paternity Leave'},
+]
+
+# Leave days per employee, leave type and state for every accrual window, see
+# LeaveBalance._read_leave_sums; shared with the index benchmark
+LEAVE_SUMS_QUERY = """
+    SELECT l.employee_id, l.holiday_status_id, l.state,
+           SUM(l.number_of_days),
+           SUM(l.number_of_days) FILTER (WHERE l.request_date_from >= %(year_start)s
+                                           AND l.request_date_to <= %(year_end)s),
+           SUM(l.number_of_days) FILTER (WHERE l.request_date_to < %(system_start)s),
+           SUM(l.number_of_days) FILTER (WHERE l.request_date_from >= %(after_start)s
+                                           AND l.request_date_to <= %(year_end)s),
+           SUM(l.number_of_days) FILTER (WHERE l.request_date_from >= p.accrual_start
+                                           AND l.request_date_to <= %(year_end)s)
+      FROM hr_leave l
+      JOIN unnest(%(employee_ids)s::int[], %(accrual_starts)s::date[]) AS p(employee_id, accrual_start)
+        ON p.employee_id = l.employee_id
+     WHERE l.state IN ('confirm', 'validate')
+       AND l.holiday_status_id = ANY(%(type_ids)s::int[])
+       AND l.active
+  GROUP BY l.employee_id, l.holiday_status_id, l.state
+"""
+
+# Leave types granted once per employment instead of once per year
+LIFETIME_LEAVE_TYPES = ['Funeral Leave', 'Marriage Leave', 'Maternity Leave', 'Paternity Leave']
+
+BALANCE_KEYS = ['total', 'total_dynamic', 'accrued_new', 'taken', 'available', 'pending', 'carried_forward', 'expired_carried']
+
+TRACKER_FIELDS = [
+    'employee_id', 'leave_type_id', 'leave_type_name', 'year', 'total_allocation', 'total_dynamic',
+    'taken_leaves', 'pending_requests', 'current_balance', 'annual_carry', 'expired_carry',
+    'imported_taken', 'import_applied', 'create_date',
+]
+
+
+# Tracker fields maintained incrementally from hr.leave changes
+DELTA_FIELDS = ['taken_leaves', 'pending_requests', 'current_balance']
+
+
+def _differs(stored, value):
+    if isinstance(stored, float) or isinstance(value, float):
+        return not float_is_zero((stored or 0.0) - (value or 0.0), precision_digits=4)
+    return stored != value
+
+
+def _empty_balance():
+    return {'total': 0, 'taken': 0, 'available': 0, 'pending': 0, 'carried_forward': 0, 'expired_carried': 0}
+
+
+class LeaveBalance(models.AbstractModel):
+    """Set-based leave balance engine.
+
+    A snapshot loads everything the accrual rules need for a set of employees
+    with a fixed number of queries (leave types, trackers and one grouped
+    aggregate over hr.leave); the rules then run in memory on that snapshot.
+    """
+    _name = 'hr.leave.balance'
+    _description = 'Leave Balance Engine'
+
+    # ------------------------------------------------------------------
+    # Policy dates
+    # ------------------------------------------------------------------
+
+    def _get_system_start_date(self):
+        """Define when your system started tracking leaves in hr_leave"""
+        return date(2025, 9, 26)
+
+    def _get_permanent_date(self, employee):
+        """Get employee's permanent date"""
+        # Check if permanent_date field exists, otherwise calculate from join_date
+        if 'permanent_date' in employee._fields and employee.permanent_date:
+            return employee.permanent_date
+        elif employee.join_date:
+            return employee.join_date + relativedelta(years=1)
+        return None
+
+    def _is_historical_data(self, year, record_create_date=None):
+        """Detect whether a tracker year predates real-time tracking in hr_leave"""
+        system_start_date = self._get_system_start_date()
+        if year < system_start_date.year:
+            return True
+        if year == system_start_date.year:
+            if record_create_date:
+                # Created before system start date → historical
+                return record_create_date < system_start_date
+            # No create_date? Check if year start is before system start
+            return date(year, 1, 1) < system_start_date
+        return False
+
+    # ------------------------------------------------------------------
+    # Month arithmetic
+    # ------------------------------------------------------------------
+
+    def _count_accrued_months(self, start_date, today):
+        """Count full months from start_date up to today."""
+        months = (today.year - start_date.year) * 12 + (today.month - start_date.month)
+        last_day_of_month = (date(today.year, today.month, 1) + relativedelta(months=1)) - timedelta(days=1)
+        if today == last_day_of_month:
+            months += 1
+        return max(0, months)
+
+    def _months_accrued(self, start_date, as_of_date, accrue_on_month_start=True):
+        if start_date > as_of_date:
+            return 0
+
+        if not accrue_on_month_start:
+            y, m = start_date.year, start_date.month
+            months = 0
+            while (y, m) <= (as_of_date.year, as_of_date.month):
+                last_day = date(y, m, monthrange(y, m)[1])
+                if last_day <= as_of_date:
+                    months += 1
+                else:
+                    break
+                if m == 12:
+                    y, m = y + 1, 1
+                else:
+                    m += 1
+            return months
+
+        # accrue_on_month_start == True:
+        months = (as_of_date.year - start_date.year) * 12 + (as_of_date.month - start_date.month)
+        if as_of_date.day > 1:
+            months += 1
+        return max(0, months)
+
+    def _calculate_monthly_accrual(self, start_date, end_date, accrual_per_month=1.0):
+        """
+        Count full months from start_date up to last completed month before end_date.
+        Include the month of start_date if it is completed.
+        """
+        if start_date > end_date:
+            return 0
+
+        months = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month)
+        # Add partial month accrual based on day completion
+        if end_date.day >= start_date.day:
+            months += 1
+        return max(months * accrual_per_month, 0)
+
+    def _calculate_previous_year_allocation(self, employee, year):
+        """Calculate what the allocation should have been for a previous year"""
+        permanent_date = self._get_permanent_date(employee)
+        if not permanent_date or year < permanent_date.year:
+            return 0
+        if year == permanent_date.year:
+            # Pro-rated allocation based on permanent month
+            return 12 - permanent_date.month + 1
+        # Full year allocation (12 months)
+        return 12
+
+    # ------------------------------------------------------------------
+    # Snapshot loading
+    # ------------------------------------------------------------------
+
+    def _get_leave_type_map(self):
+        """Policy leave type name to hr.leave.type ids, from the registry-level cache"""
+        return self.env['hr.leave.type']._get_policy_type_map()
+
+    def _read_trackers(self, employees, years):
+        """Read the trackers of all employees for the given years in one query"""
+        Tracker = self.env['hr.leave.tracker']
+        tracker_fields = [f for f in TRACKER_FIELDS if f in Tracker._fields]
+        rows = Tracker.search_read([
+            ('employee_id', 'in', employees.ids),
+            ('year', 'in', [str(y) for y in years]),
+        ], tracker_fields, order='id')
+        trackers = {employee.id: [] for employee in employees}
+        for row in rows:
+            row['leave_type_id'] = row['leave_type_id'] and row['leave_type_id'][0]
+            trackers[row['employee_id'][0]].append(row)
+        return trackers
+
+    def _read_leave_sums(self, employees, today, accrual_starts, type_ids):
+        """Aggregate leave days per employee, leave type and state in one grouped query.
+
+        Each row carries the sum for every date window the accrual rules use:
+        the whole history, the current calendar year, before and after the
+        system start date and from the employee's annual accrual start.
+        """
+        year_start = date(today.year, 1, 1)
+        year_end = date(today.year, 12, 31)
+        system_start = self._get_system_start_date()
+
+        self.env['hr.leave'].flush([
+            'employee_id', 'holiday_status_id', 'state', 'active',
+            'request_date_from', 'request_date_to', 'number_of_days',
+        ])
+        self.env.cr.execute(LEAVE_SUMS_QUERY, {
+            'employee_ids': employees.ids,
+            'accrual_starts': [accrual_starts.get(employee.id) for employee in employees],
+            'year_start': year_start,
+            'year_end': year_end,
+            'system_start': system_start,
+            'after_start': max(year_start, system_start),
+            'type_ids': sorted({type_id for ids in type_ids.values() for type_id in ids}),
+        })
+
+        buckets = ('lifetime', 'year', 'before_start', 'after_start', 'accrual')
+        sums = {employee.id: {} for employee in employees}
+        for row in self.env.cr.fetchall():
+            employee_id, type_id, state = row[:3]
+            sums[employee_id][(type_id, state)] = dict(zip(buckets, (value or 0.0 for value in row[3:])))
+        return sums
+
+    def _compute_accruals(self, employees, as_of):
+        """Accrual figures of many employees in one vectorized pass, keyed by employee id.
+
+        See :func:`~.leave_accrual.compute_accruals` for the returned keys.
+        """
+        join_dates = employees.mapped('join_date')
+        if 'permanent_date' in employees._fields:
+            permanent_dates = employees.mapped('permanent_date')
+        else:
+            permanent_dates = [False] * len(employees)
+        accruals = compute_accruals(join_dates, permanent_dates, as_of)
+        return {
+            employee.id: {key: accruals[key][index] for key in ACCRUAL_KEYS}
+            for index, employee in enumerate(employees)
+        }
+
+    def _get_annual_accrual_start(self, accruals, today, trackers, annual_type_ids):
+        """Return (accrual_start, tracker) used by the annual accrual rule.
+
+        ``tracker`` is the imported start-year tracker when the tracker branch
+        applies, otherwise False and the accrual runs from the system calculation.
+        """
+        service_date = accruals['service_date']
+        if not service_date or today < service_date:
+            return None, False
+
+        system_start_date = self._get_system_start_date()
+        if today.year == system_start_date.year:
+            for tracker in trackers:
+                if tracker['leave_type_id'] in annual_type_ids and str(tracker['year']) == str(system_start_date.year):
+                    return max(tracker['create_date'].date(), service_date), tracker
+
+        accrual_start = service_date if today.year == service_date.year else date(today.year, 1, 1)
+        return accrual_start, False
+
+    def _load_snapshot(self, employees, today):
+        """Load everything needed to compute the balances of ``employees`` as of ``today``"""
+        type_ids, exact_ids = self._get_leave_type_map()
+        system_start_year = self._get_system_start_date().year
+        trackers = self._read_trackers(employees, {today.year, today.year - 1, system_start_year})
+
+        accruals = self._compute_accruals(employees, today)
+
+        accrual = {}
+        for employee in employees:
+            accrual[employee.id] = self._get_annual_accrual_start(
+                accruals[employee.id], today, trackers[employee.id], type_ids['Annual Leave'])
+        sums = self._read_leave_sums(employees, today, {k: v[0] for k, v in accrual.items()}, type_ids)
+
+        return {
+            'today': today,
+            'year': today.year,
+            'type_ids': type_ids,
+            'exact_type_ids': exact_ids,
+            'trackers': trackers,
+            'sums': sums,
+            'accruals': accruals,
+            'accrual': accrual,
+        }
+
+    # ------------------------------------------------------------------
+    # In-memory rules
+    # ------------------------------------------------------------------
+
+    def _leave_days(self, ctx, leave_type, state, bucket):
+        """Sum of leave days of ``leave_type`` in ``state`` for one date window of the snapshot"""
+        sums = ctx['sums']
+        return sum(
+            sums.get((type_id, state), {}).get(bucket, 0.0)
+            for type_id in ctx['type_ids'].get(leave_type, [])
+        )
+
+    def _get_actual_taken_leaves(self, ctx, leave_type):
+        bucket = 'lifetime' if leave_type in LIFETIME_LEAVE_TYPES else 'year'
+        return self._leave_days(ctx, leave_type, 'validate', bucket)
+
+    def _get_actual_pending_leaves(self, ctx, leave_type):
+        bucket = 'lifetime' if leave_type in LIFETIME_LEAVE_TYPES else 'year'
+        return self._leave_days(ctx, leave_type, 'confirm', bucket)
+
+    def _find_tracker(self, ctx, predicate):
+        return next((t for t in ctx['employee_trackers'] if predicate(t)), False)
+
+    def _plan_tracker_write(self, ctx, tracker, vals):
+        """Record tracker values to persist; later writes win like sequential ORM writes"""
+        tracker.update(vals)
+        ctx['plan']['write'].setdefault(tracker['id'], {}).update(vals)
+
+    def _get_carry_forward_from_previous_year(self, ctx, leave_type_name='Annual Leave'):
+        """Carry forward the remaining balance from the previous year."""
+        if leave_type_name != 'Annual Leave':
+            return 0
+        previous_year = str(ctx['year'] - 1)
+        previous_tracker = self._find_tracker(
+            ctx, lambda t: t['leave_type_name'] == leave_type_name and str(t['year']) == previous_year)
+        if previous_tracker:
+            return max(previous_tracker['current_balance'] or 0, 0)
+        return 0
+
+    def _calculate_casual_leave_accrual(self, ctx):
+        # Full year allocation once permanent before this year, otherwise from the
+        # permanent month (inclusive) through December: 2025-08-26 -> 5 months
+        if not ctx['accruals']['casual_eligible']:
+            return _empty_balance()
+        total_casual = ctx['accruals']['casual_total']
+
+        taken = self._get_actual_taken_leaves(ctx, 'Casual Leave')
+        pending = self._get_actual_pending_leaves(ctx, 'Casual Leave')
+        return {
+            'total': total_casual,
+            'taken': taken,
+            'available': max(total_casual - taken, 0),
+            'pending': pending,
+            'carried_forward': 0,
+            'expired_carried': 0,
+        }
+
+    def _calculate_annual_leave_accrual(self, ctx):
+        """Calculate annual leave accrual for an employee and plan the total_dynamic tracker update"""
+        today = ctx['today']
+        current_year = today.year
+        accrual_start, start_tracker = ctx['accrual']
+        empty = dict(_empty_balance(), total_dynamic=0, accrued_new=0, system_taken=0)
+        if not accrual_start:
+            return empty
+
+        cutoff = date(current_year, 6, 30)
+        validated_taken = self._leave_days(ctx, 'Annual Leave', 'validate', 'accrual')
+        pending = self._get_actual_pending_leaves(ctx, 'Annual Leave')
+
+        # ---------------- Tracker branch ----------------
+        if start_tracker:
+            accrued_new = self._count_accrued_months(accrual_start, today)
+            static_allocation = start_tracker['total_allocation'] or 0
+            total_dynamic = static_allocation + accrued_new
+            vals = {'total_dynamic': total_dynamic}
+
+            if not start_tracker.get('import_applied', False):
+                final_taken = (start_tracker['taken_leaves'] or 0) + validated_taken + (start_tracker.get('imported_taken') or 0)
+                vals['import_applied'] = True
+            else:
+                final_taken = (start_tracker['taken_leaves'] or 0) + validated_taken
+            self._plan_tracker_write(ctx, start_tracker, vals)
+
+            return {
+                'total': static_allocation,
+                'total_dynamic': total_dynamic,
+                'accrued_new': accrued_new,
+                'taken': validated_taken,
+                'available': max(total_dynamic - final_taken, 0),
+                'pending': pending,
+                'carried_forward': 0,
+                'expired_carried': 0,
+            }
+
+        # ---------------- System calculation branch (no tracker) ----------------
+        carry_from_last_year = self._get_carry_forward_from_previous_year(ctx, 'Annual Leave')
+        accrued_new = ctx['accruals']['annual_accrued']
+        total_taken = validated_taken
+
+        if today <= cutoff:
+            # Before cutoff, carry is still active
+            total = carry_from_last_year + accrued_new
+            resp_carried = carry_from_last_year
+            resp_expired = 0
+            final_taken = total_taken
+        else:
+            # After cutoff, deduct carry first
+            taken_from_carry = min(carry_from_last_year, total_taken)
+            final_taken = total_taken - taken_from_carry
+            resp_carried = 0
+            resp_expired = max(carry_from_last_year - total_taken, 0)
+            total = accrued_new + resp_carried
+        total_dynamic = total
+        available = max(total_dynamic - final_taken, 0)
+
+        # Persist system calculation in the tracker of the first annual leave type
+        annual_type_ids = ctx['type_ids']['Annual Leave']
+        if annual_type_ids:
+            tracker_vals = {
+                'total_allocation': total,
+                'total_dynamic': total_dynamic,
+                'taken_leaves': final_taken,
+                'annual_carry': resp_carried,
+                'expired_carry': resp_expired,
+            }
+            year = str(current_year)
+            tracker = self._find_tracker(
+                ctx, lambda t: t['leave_type_id'] == annual_type_ids[0] and str(t['year']) == year)
+            if tracker:
+                self._plan_tracker_write(ctx, tracker, tracker_vals)
+            else:
+                ctx['annual_tracker_vals'] = dict(tracker_vals, leave_type_id=annual_type_ids[0])
+
+        return {
+            'total': total,
+            'total_dynamic': total_dynamic,
+            'accrued_new': accrued_new,
+            'taken': total_taken,
+            'system_taken': final_taken,
+            'available': available,
+            'pending': pending,
+            'carried_forward': resp_carried,
+            'expired_carried': resp_expired,
+        }
+
+    def _calculate_fixed_leave(self, ctx, total_allocation, leave_type):
+        """Calculate fixed annual allocation leaves (medical, unpaid)"""
+        taken = self._leave_days(ctx, leave_type, 'validate', 'year')
+        pending = self._leave_days(ctx, leave_type, 'confirm', 'year')
+        return {
+            'total': total_allocation,
+            'taken': taken,
+            'available': max(total_allocation - taken, 0),
+            'pending': pending,
+            'carried_forward': 0,
+            'expired_carried': 0,
+        }
+
+    def _calculate_lifetime_leave(self, ctx, total_allocation, leave_type):
+        """Calculate lifetime allocation leaves (funeral, marriage, maternity, paternity)"""
+        taken = self._leave_days(ctx, leave_type, 'validate', 'lifetime')
+        pending = self._leave_days(ctx, leave_type, 'confirm', 'lifetime')
+        return {
+            'total': total_allocation,
+            'taken': taken,
+            'available': max(total_allocation - taken, 0),
+            'pending': pending,
+            'carried_forward': 0,
+            'expired_carried': 0,
+        }
+
+    def _calculate_default_leave_balance(self, ctx, leave_type):
+        """Calculate leave balance using default logic when no tracker record exists"""
+        employee = ctx['employee']
+        gender = (employee.gender or '').lower()
+        marital_status = (employee.marital or '').lower()
+        service_months = ctx['accruals']['service_months']
+
+        if leave_type == 'Casual Leave':
+            return self._calculate_casual_leave_accrual(ctx)
+        elif leave_type == 'Annual Leave' and service_months >= 12:
+            return self._calculate_annual_leave_accrual(ctx)
+        elif leave_type == 'Medical Leave' and service_months >= 6:
+            return self._calculate_fixed_leave(ctx, 30, leave_type)
+        elif leave_type == 'Funeral Leave':
+            return self._calculate_lifetime_leave(ctx, 7, leave_type)
+        elif leave_type == 'Marriage Leave' and marital_status == 'single' and service_months >= 12:
+            return self._calculate_lifetime_leave(ctx, 5, leave_type)
+        elif leave_type == 'Unpaid Leave':
+            return self._calculate_fixed_leave(ctx, 30, leave_type)
+        elif leave_type == 'Maternity Leave' and marital_status == 'married' and gender == 'female':
+            return self._calculate_lifetime_leave(ctx, 98, leave_type)
+        elif leave_type == 'Paternity Leave' and marital_status == 'married' and gender == 'male':
+            return self._calculate_lifetime_leave(ctx, 15, leave_type)
+        # If not eligible, return empty balance
+        return _empty_balance()
+
+    def _update_existing_record(self, ctx, record):
+        """
+        Recalculate a tracker with total_dynamic support:
+        - Keep total_allocation unchanged (static base allocation)
+        - Calculate total_dynamic = total_allocation + accrued_new
+        - Use total_dynamic for availability calculations
+        """
+        today = ctx['today']
+        leave_type = record['leave_type_name']
+        record_create_date = record['create_date'].date() if record['create_date'] else None
+        is_historical = self._is_historical_data(today.year, record_create_date)
+
+        if leave_type not in ('Annual Leave', 'Casual Leave'):
+            # For all other leave types, recalc from hr.leave instead of trusting tracker
+            total_taken = self._get_actual_taken_leaves(ctx, leave_type)
+            pending = self._get_actual_pending_leaves(ctx, leave_type)
+            total_allocation = record['total_allocation'] or 0.0
+            return {
+                'total': total_allocation,
+                'taken': total_taken,
+                'system_taken': total_taken,
+                'available': max(total_allocation - total_taken, 0),
+                'pending': pending,
+                'carried_forward': record.get('annual_carry', 0),
+                'expired_carried': record.get('expired_carry', 0),
+            }
+
+        # Casual accrual only feeds the defaults, the tracker keeps its allocation
+        accrual = self._calculate_annual_leave_accrual(ctx) if leave_type == 'Annual Leave' else {}
+
+        if is_historical:
+            system_start = self._get_system_start_date()
+            # Always use imported_taken as base for historical data
+            base_taken = record.get('imported_taken') or 0.0
+            if base_taken == 0.0:
+                if record_create_date and record_create_date < system_start:
+                    base_taken = record['taken_leaves'] or 0.0
+                    if 'imported_taken' in record:
+                        self._plan_tracker_write(ctx, record, {'imported_taken': base_taken})
+                else:
+                    base_taken = self._leave_days(ctx, leave_type, 'validate', 'before_start')
+
+            new_taken = self._leave_days(ctx, leave_type, 'validate', 'after_start')
+            total_taken = base_taken + new_taken
+            pending = self._get_actual_pending_leaves(ctx, leave_type)
+            total_allocation = record['total_allocation'] or 0.0
+
+            if leave_type == 'Annual Leave':
+                total_dynamic = total_allocation + accrual.get('accrued_new', 0)
+                system_taken = accrual.get('system_taken', total_taken)
+            else:
+                total_dynamic = total_allocation
+                system_taken = total_taken
+
+            return {
+                'total': total_allocation,
+                'total_dynamic': total_dynamic if leave_type == 'Annual Leave' else None,
+                'taken': total_taken,
+                'system_taken': system_taken,
+                'available': max(total_dynamic - total_taken, 0.0),
+                'pending': pending,
+                'carried_forward': record.get('annual_carry', 0),
+                'expired_carried': record.get('expired_carry', 0),
+            }
+
+        # real-time: use live accrual + actuals
+        total_taken = self._get_actual_taken_leaves(ctx, leave_type)
+        pending = self._get_actual_pending_leaves(ctx, leave_type)
+        total_allocation = record['total_allocation'] or 0.0
+
+        if leave_type == 'Annual Leave':
+            total_dynamic = accrual['total']
+            system_taken = accrual.get('system_taken', total_taken)
+        else:
+            total_dynamic = total_allocation
+            system_taken = total_taken
+
+        return {
+            'total': total_allocation,
+            'total_dynamic': total_dynamic if leave_type == 'Annual Leave' else None,
+            'taken': total_taken,
+            'system_taken': system_taken,
+            'available': max(total_dynamic - total_taken, 0),
+            'pending': pending,
+            'carried_forward': accrual.get('carried_forward', 0),
+            'expired_carried': accrual.get('expired_carried', 0),
+        }
+
+    def _balance_from_tracker(self, ctx, leave_type, record):
+        """Compute the balance of an existing tracker and plan its stored values"""
+        leave_balance = self._update_existing_record(ctx, record)
+        leave_balance.setdefault('system_taken', leave_balance.get('taken', 0))
+
+        # After the June 30 cutoff annual leave stores the carry-adjusted figure
+        if leave_type == 'Annual Leave' and ctx['today'] > date(ctx['year'], 6, 30):
+            taken_to_store = leave_balance.get('system_taken', 0)
+        else:
+            taken_to_store = leave_balance.get('taken', 0)
+
+        total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
+        available_to_store = total_to_check - taken_to_store
+
+        self._plan_tracker_write(ctx, record, {
+            'taken_leaves': taken_to_store,
+            'pending_requests': leave_balance.get('pending', 0),
+            'current_balance': available_to_store,
+            'annual_carry': leave_balance.get('carried_forward', 0),
+            'expired_carry': leave_balance.get('expired_carried', 0),
+        })
+        leave_balance['taken'] = taken_to_store
+        leave_balance['available'] = available_to_store
+        return leave_balance
+
+    def _balance_without_tracker(self, ctx, leave_type):
+        """Compute the default balance and plan the creation of its tracker"""
+        employee = ctx['employee']
+        year = ctx['year']
+        balance = self._calculate_default_leave_balance(ctx, leave_type)
+
+        tracker_vals = {
+            'employee_id': employee.id,
+            'leave_type_id': ctx['exact_type_ids'].get(leave_type),
+            'leave_type_name': leave_type,
+            'year': year,
+            'total_allocation': balance['total'],  # This is the static base allocation
+            'taken_leaves': balance['taken'],
+            'pending_requests': balance['pending'],
+            'current_balance': balance['available'],
+            'employee_name': employee.name,
+            'employee_number': employee.employee_number or '',
+            'name': f"{leave_type} {year}",
+            'department_id': employee.department_id.id,
+            'annual_carry': balance.get('carried_forward', 0),
+            'expired_carry': balance.get('expired_carried', 0),
+            'is_historical': date(year, 1, 1) < self._get_system_start_date(),
+        }
+        if leave_type == 'Annual Leave' and ctx.get('annual_tracker_vals'):
+            tracker_vals.update(ctx.pop('annual_tracker_vals'))
+        ctx['plan']['create'].append(tracker_vals)
+
+        result = {key: balance.get(key, 0) for key in ('total', 'taken', 'available', 'pending', 'carried_forward', 'expired_carried')}
+        if leave_type == 'Annual Leave' and balance.get('total_dynamic'):
+            result['total_dynamic'] = balance['total_dynamic']
+        return result
+
+    def _compute_employee_balances(self, employee, snapshot):
+        """Return (balances, plan) for one employee of a loaded snapshot.
+
+        ``balances`` maps the short leave type name to its balance dict and only
+        contains types with an allocation, taken or pending days. ``plan`` holds
+        the tracker writes and creations that keep hr.leave.tracker in sync.
+        """
+        year = str(snapshot['year'])
+        ctx = dict(
+            snapshot,
+            employee=employee,
+            employee_trackers=snapshot['trackers'][employee.id],
+            sums=snapshot['sums'][employee.id],
+            accruals=snapshot['accruals'][employee.id],
+            accrual=snapshot['accrual'][employee.id],
+            plan={'write': {}, 'create': []},
+        )
+        stored = {t['id']: dict(t) for t in ctx['employee_trackers']}
+
+        balances = {}
+        for leave_type in LEAVE_TYPES:
+            name = leave_type['display_name']
+            tracker = self._find_tracker(
+                ctx, lambda t: t['leave_type_name'] == name and str(t['year']) == year)
+            if tracker:
+                leave_balance = self._balance_from_tracker(ctx, name, tracker)
+            else:
+                leave_balance = self._balance_without_tracker(ctx, name)
+
+            # --- Ensure all numeric fields exist and are not None ---
+            for key in BALANCE_KEYS:
+                leave_balance[key] = leave_balance.get(key) or 0
+
+            total_to_check = float(leave_balance.get('total_dynamic') or leave_balance.get('total') or 0)
+            if total_to_check > 0 or leave_balance['pending'] > 0 or leave_balance['taken'] > 0:
+                balances[leave_type['name']] = leave_balance
+
+        if ctx.get('annual_tracker_vals'):
+            # Annual tracker of another annual leave type than the exact "Annual Leave"
+            ctx['plan']['create'].append(dict(
+                ctx['annual_tracker_vals'], employee_id=employee.id, year=snapshot['year']))
+
+        # Only write the tracker values that actually change
+        writes = ctx['plan']['write']
+        for tracker_id, vals in list(writes.items()):
+            writes[tracker_id] = {k: v for k, v in vals.items() if _differs(stored[tracker_id].get(k), v)}
+            if not writes[tracker_id]:
+                del writes[tracker_id]
+        return balances, ctx['plan']
+
+    def _compute_balances(self, employees, today):
+        """Compute balances for many employees with a fixed number of queries.
+
+        This is a pure read: nothing is written. Returns a dict mapping each
+        employee id to its (balances, plan) pair; pass the plans to
+        :meth:`_apply_tracker_plan` to persist them.
+        """
+        if not employees:
+            return {}
+        snapshot = self._load_snapshot(employees, today)
+        return {
+            employee.id: self._compute_employee_balances(employee, snapshot)
+            for employee in employees
+        }
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _get_or_create_leave_type(self, name):
+        LeaveType = self.env['hr.leave.type']
+        leave_type = LeaveType.search([('name', '=', name)], limit=1)
+        return leave_type or LeaveType.create({'name': name})
+
+    def _apply_tracker_plan(self, plans):
+        """Persist planned tracker writes and creations.
+
+        Trackers receiving identical values share a single write, and all new
+        trackers are created in one batch.
+        """
+        Tracker = self.env['hr.leave.tracker']
+        writes = defaultdict(list)
+        to_create = []
+        for plan in plans:
+            for tracker_id, vals in plan['write'].items():
+                writes[tuple(sorted(vals.items()))].append(tracker_id)
+            for vals in plan['create']:
+                vals = {k: v for k, v in vals.items() if k in Tracker._fields}
+                if not vals.get('leave_type_id'):
+                    vals['leave_type_id'] = self._get_or_create_leave_type(vals['leave_type_name']).id
+                to_create.append(vals)
+        for items, tracker_ids in writes.items():
+            Tracker.browse(tracker_ids).write(dict(items))
+        if to_create:
+            Tracker.create(to_create)
+
+    def _recompute_trackers(self, employees, today=None):
+        """Recompute and store the hr.leave.tracker rows of ``employees``"""
+        today = today or fields.Date.context_today(self)
+        results = self._compute_balances(employees, today)
+        self._apply_tracker_plan([plan for _balances, plan in results.values()])
+        _logger.debug("Recomputed leave trackers for %s employee(s)", len(results))
+        return results
+
+    @api.model
+    def _reconcile_trackers(self, employees=None, fix=False, chunk_size=500):
+        """Verify the incrementally maintained tracker values against a full recompute.
+
+        Returns one entry per drifting tracker with the stored and expected
+        values of the delta-maintained fields; with ``fix`` the recomputed
+        values are written back.
+        """
+        today = fields.Date.context_today(self)
+        Tracker = self.env['hr.leave.tracker']
+        if employees is None:
+            employees = self.env['hr.employee'].search([('active', '=', True)], order='id')
+
+        drifts = []
+        for chunk in split_every(chunk_size, employees.ids):
+            results = self._compute_balances(self.env['hr.employee'].browse(chunk), today)
+            plans = [plan for _balances, plan in results.values()]
+            expected = {
+                tracker_id: {f: vals[f] for f in DELTA_FIELDS if f in vals}
+                for plan in plans for tracker_id, vals in plan['write'].items()
+            }
+            expected = {tracker_id: vals for tracker_id, vals in expected.items() if vals}
+            for row in Tracker.browse(list(expected)).read(['employee_id', 'leave_type_name', 'year'] + DELTA_FIELDS):
+                drifts.append({
+                    'tracker_id': row['id'],
+                    'employee_id': row['employee_id'][0],
+                    'leave_type_name': row['leave_type_name'],
+                    'year': row['year'],
+                    'fields': {f: (row[f], v) for f, v in expected[row['id']].items()},
+                })
+            if fix:
+                self._apply_tracker_plan(plans)
+
+        if drifts:
+            _logger.warning("Leave tracker reconcile: %s tracker(s) drifted from a full recompute%s",
+                            len(drifts), ", fixed" if fix else "")
+        else:
+            _logger.info("Leave tracker reconcile: %s employee(s) in sync", len(employees))
+        return drifts
+
+    @api.model
+    def _cron_recompute_trackers(self, chunk_size=500):
+        """Nightly recompute of the trackers of every active employee.
+
+        Employees are processed in chunks: each chunk costs one snapshot and
+        one batch of tracker writes, and is committed on its own so a failure
+        late in the run keeps the work already done.
+        """
+        today = fields.Date.context_today(self)
+        employee_ids = self.env['hr.employee'].search([('active', '=', True)], order='id').ids
+        started = time.time()
+        done = 0
+
+        for chunk in split_every(chunk_size, employee_ids):
+            self._recompute_trackers(self.env['hr.employee'].browse(chunk), today)
+            done += len(chunk)
+            if not getattr(threading.current_thread(), 'testing', False):
+                self.env.cr.commit()
+            # Keep memory flat across chunks
+            self.invalidate_cache()
+            _logger.info("Leave tracker recompute: %s/%s employees", done, len(employee_ids))
+
+        duration = time.time() - started
+        _logger.info(
+            "Leave tracker recompute done: %s employees in %.1fs (%.1f employees/sec)",
+            done, duration, done / duration if duration else 0.0,
+        )
@@ -0,0 +1,155 @@
+import json
+import logging
+from collections import Counter
+
+import psycopg2
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Upper bound on how long a cached balance may outlive a missed invalidation
+# (a fill racing with a concurrent hr.leave change)
+CACHE_TTL_MINUTES = 15
+
+# Per-worker hit/miss counters, logged every STATS_LOG_INTERVAL lookups
+_stats = Counter()
+STATS_LOG_INTERVAL = 1000
+
+# hr.leave fields the balances depend on
+LEAVE_BALANCE_FIELDS = {
+    'employee_id', 'holiday_status_id', 'state', 'active',
+    'request_date_from', 'request_date_to', 'number_of_days',
+}
+
+# hr.employee fields the balances depend on
+EMPLOYEE_BALANCE_FIELDS = {'join_date', 'permanent_date', 'category_ids', 'gender', 'marital'}
+
+
+class LeaveBalanceCache(models.Model):
+    """Computed portal balances keyed by (employee, year, as-of date).
+
+    Rows live in an unlogged table so every prefork worker of the server
+    shares them, and invalidation happens in the same transaction as the
+    hr.leave, tracker or employee change that makes them stale.
+    """
+    _name = 'hr.leave.balance.cache'
+    _description = 'Leave Balance Cache'
+    _log_access = False
+
+    employee_id = fields.Many2one('hr.employee', required=True, ondelete='cascade', index=True)
+    year = fields.Integer(required=True)
+    as_of = fields.Date(required=True)
+    payload = fields.Text(required=True)
+    computed_at = fields.Datetime(required=True)
+
+    _sql_constraints = [
+        ('employee_as_of_uniq', 'unique(employee_id, year, as_of)', 'Only one cached balance per employee and date.'),
+    ]
+
+    def init(self):
+        # The cache is rebuilt on demand, it does not need WAL or crash safety
+        self.env.cr.execute("ALTER TABLE %s SET UNLOGGED" % self._table)
+
+    @api.model
+    def _get_balances(self, employee, today):
+        """Return the balances of ``employee`` as of ``today``, computing them on a miss"""
+        cr = self.env.cr
+        cr.execute("""
+            SELECT payload FROM hr_leave_balance_cache
+             WHERE employee_id = %s AND year = %s AND as_of = %s
+               AND computed_at > (now() AT TIME ZONE 'UTC') - make_interval(mins => %s)
+        """, (employee.id, today.year, today, CACHE_TTL_MINUTES))
+        row = cr.fetchone()
+        if row:
+            self._count('hits')
+            return json.loads(row[0])
+
+        self._count('misses')
+        balances, _plan = self.env['hr.leave.balance']._compute_balances(employee, today)[employee.id]
+        try:
+            with cr.savepoint(flush=False):
+                cr.execute("""
+                    INSERT INTO hr_leave_balance_cache (employee_id, year, as_of, payload, computed_at)
+                    VALUES (%s, %s, %s, %s, now() AT TIME ZONE 'UTC')
+                    ON CONFLICT (employee_id, year, as_of)
+                    DO UPDATE SET payload = EXCLUDED.payload, computed_at = EXCLUDED.computed_at
+                """, (employee.id, today.year, today, json.dumps(balances)))
+        except psycopg2.Error as e:
+            # Another worker filled or invalidated the same key concurrently: serve without caching
+            _logger.debug("Skipped leave balance cache fill for employee %s: %s", employee.id, e)
+        return balances
+
+    @api.model
+    def _invalidate(self, employee_ids):
+        """Drop the cached balances of the given employees"""
+        employee_ids = [employee_id for employee_id in set(employee_ids) if employee_id]
+        if not employee_ids:
+            return
+        self.env.cr.execute(
+            "DELETE FROM hr_leave_balance_cache WHERE employee_id IN %s", (tuple(employee_ids),))
+        _stats['invalidations'] += self.env.cr.rowcount
+
+    @api.model
+    def _invalidate_all(self):
+        self.env.cr.execute("DELETE FROM hr_leave_balance_cache")
+        _stats['invalidations'] += self.env.cr.rowcount
+
+    @api.model
+    def _count(self, key):
+        _stats[key] += 1
+        lookups = _stats['hits'] + _stats['misses']
+        if lookups % STATS_LOG_INTERVAL == 0:
+            _logger.info("Leave balance cache: %s", self._get_cache_stats())
+
+    @api.model
+    def _get_cache_stats(self):
+        """Hit/miss counters of the current worker"""
+        lookups = _stats['hits'] + _stats['misses']
+        return {
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'invalidations': _stats['invalidations'],
+            'hit_ratio': round(_stats['hits'] / lookups, 3) if lookups else 0.0,
+        }
+
+    def _register_hook(self):
+        """Invalidate on hr.leave.tracker changes.
+
+        The tracker model is provided by another module that this one does not
+        depend on, so it is hooked at registry setup (like base_automation does)
+        instead of being inherited.
+        """
+        super()._register_hook()
+        Tracker = self.env.registry.get('hr.leave.tracker')
+        if Tracker is None or getattr(Tracker, '_balance_cache_hooked', False):
+            return
+
+        def make_create():
+            @api.model_create_multi
+            def create(self, vals_list, **kw):
+                records = create.origin(self, vals_list, **kw)
+                self.env['hr.leave.balance.cache'].sudo()._invalidate(records.employee_id.ids)
+                return records
+            return create
+
+        def make_write():
+            def write(self, vals, **kw):
+                employee_ids = self.employee_id.ids
+                res = write.origin(self, vals, **kw)
+                self.env['hr.leave.balance.cache'].sudo()._invalidate(employee_ids + self.employee_id.ids)
+                return res
+            return write
+
+        def make_unlink():
+            def unlink(self, **kw):
+                employee_ids = self.employee_id.ids
+                res = unlink.origin(self, **kw)
+                self.env['hr.leave.balance.cache'].sudo()._invalidate(employee_ids)
+                return res
+            return unlink
+
+        Tracker._patch_method('create', make_create())
+        Tracker._patch_method('write', make_write())
+        Tracker._patch_method('unlink', make_unlink())
+        Tracker._balance_cache_hooked = True
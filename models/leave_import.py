@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+import logging
+import time
+
+from odoo import api, fields, models
+from odoo.tools import split_every
+
+from .leave_balance import LEAVE_TYPES
+
+_logger = logging.getLogger(__name__)
+
+IMPORT_STATES = ('confirm', 'validate')
+
+# Keep chatter, activities and mails out of back-office loads
+IMPORT_CONTEXT = {
+    'tracking_disable': True,
+    'mail_create_nolog': True,
+    'mail_notrack': True,
+    'mail_activity_automation_skip': True,
+    'leave_fast_create': True,
+    'import_file': True,
+    'leave_skip_tracker_update': True,
+}
+
+
+def parse_leave_rows(content, file_format):
+    """Rows of a CSV (with header) or JSON lines import as ``(line number, dict)`` pairs.
+
+    Returns ``(rows, errors)``: lines that cannot be read are reported in
+    ``errors`` as ``{'line', 'error'}`` instead of failing the whole import.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    rows = []
+    errors = []
+    if file_format == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        line = 1
+        try:
+            for line, row in enumerate(reader, start=2):
+                if None in row:
+                    # Values beyond the header columns
+                    errors.append({'line': line, 'error': 'Too many columns'})
+                    continue
+                rows.append((line, {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}))
+        except csv.Error as e:
+            errors.append({'line': line + 1, 'error': 'Invalid CSV: %s' % e})
+        return rows, errors
+    if file_format == 'jsonl':
+        for line, text in enumerate(content.splitlines(), start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                errors.append({'line': line, 'error': 'Invalid JSON: %s' % e})
+                continue
+            if not isinstance(row, dict):
+                errors.append({'line': line, 'error': 'Expected a JSON object'})
+                continue
+            rows.append((line, {str(key).strip().lower(): value for key, value in row.items()}))
+        return rows, errors
+    raise ValueError("Unsupported import format: %s" % file_format)
+
+
+class LeaveImport(models.AbstractModel):
+    """Bulk creation of leaves for HR back-office loads (paper forms, leave history).
+
+    Employees and leave types are resolved for the whole file at once,
+    overlaps are checked set-wise in one query, leaves are created in
+    batches without notifications, and the trackers of the imported
+    employees are recomputed once at the end.
+    """
+    _name = 'hr.leave.import'
+    _description = 'Leave Bulk Import'
+
+    @api.model
+    def _import_leaves(self, content, file_format='csv', dry_run=False, batch_size=500, progress=None):
+        """Import the leaves of ``content``; returns a report of created rows and errors per line.
+
+        Columns: ``employee_number``, ``leave_type`` (policy category, e.g.
+        "Casual Leave" or "casual"), ``date_from``, ``date_to`` (YYYY-MM-DD),
+        optional ``number_of_days`` (default: working days of the employee's
+        calendar), ``description`` and ``state`` (confirm/validate, default
+        confirm). ``progress(done, total)`` is called after each batch.
+        """
+        started = time.time()
+        rows, errors = parse_leave_rows(content, file_format)
+        row_count = len(rows) + len(errors)
+        valid = self._validate_rows(rows, errors)
+        valid = self._drop_overlaps(valid, errors)
+
+        report = {
+            'rows': row_count,
+            'valid': len(valid),
+            'created': 0,
+            'errors': sorted(errors, key=lambda error: error['line']),
+            'dry_run': dry_run,
+        }
+        if dry_run or not valid:
+            return report
+
+        Leave = self.env['hr.leave'].sudo().with_context(**IMPORT_CONTEXT)
+        created = Leave.browse()
+        done = 0
+        for batch in split_every(batch_size, valid):
+            created |= self._create_batch(Leave, batch, report['errors'])
+            done += len(batch)
+            if progress:
+                progress(done, len(valid))
+            _logger.info("Leave import: %s/%s rows", done, len(valid))
+
+        employees = created.employee_id
+        self.env['hr.leave.balance.cache'].sudo()._invalidate(employees.ids)
+        if 'hr.leave.tracker' in self.env:
+            self.env['hr.leave.balance'].sudo()._recompute_trackers(employees)
+
+        report['created'] = len(created)
+        report['errors'].sort(key=lambda error: error['line'])
+        _logger.info(
+            "Leave import done: %s leaves for %s employees in %.1fs, %s errors",
+            len(created), len(employees), time.time() - started, len(report['errors']),
+        )
+        return report
+
+    @api.model
+    def _validate_rows(self, rows, errors):
+        """Resolve employees and leave types in bulk; returns ``(line, values)`` for valid rows"""
+        numbers = {str(row.get('employee_number') or '').strip() for _line, row in rows}
+        employees = {
+            employee.employee_number: employee
+            for employee in self.env['hr.employee'].sudo().search([('employee_number', 'in', list(numbers))])
+        }
+
+        type_ids, exact_ids = self.env['hr.leave.balance'].sudo()._get_leave_type_map()
+        leave_types = {}
+        for leave_type in LEAVE_TYPES:
+            type_id = exact_ids.get(leave_type['display_name']) or next(iter(type_ids[leave_type['display_name']]), False)
+            if type_id:
+                leave_types[leave_type['name']] = type_id
+                leave_types[leave_type['display_name'].lower()] = type_id
+
+        valid = []
+        for line, row in rows:
+            employee = employees.get(str(row.get('employee_number') or '').strip())
+            type_id = leave_types.get(str(row.get('leave_type') or '').strip().lower())
+            state = row.get('state') or 'confirm'
+            try:
+                date_from = fields.Date.to_date(row.get('date_from'))
+                date_to = fields.Date.to_date(row.get('date_to'))
+                number_of_days = float(row['number_of_days']) if row.get('number_of_days') else None
+            except (TypeError, ValueError):
+                errors.append({'line': line, 'error': 'Invalid date or number of days'})
+                continue
+
+            if not employee:
+                error = 'Unknown employee %s' % row.get('employee_number')
+            elif not type_id:
+                error = 'Unknown leave type %s' % row.get('leave_type')
+            elif not date_from or not date_to or date_from > date_to:
+                error = 'Invalid date range'
+            elif state not in IMPORT_STATES:
+                error = 'Invalid state %s' % state
+            else:
+                error = None
+            if error:
+                errors.append({'line': line, 'error': error})
+                continue
+
+            valid.append((line, {
+                'name': row.get('description') or 'Imported leave',
+                'employee_id': employee.id,
+                'holiday_status_id': type_id,
+                'request_date_from': date_from,
+                'request_date_to': date_to,
+                # Same count as portal submissions: working days of the employee's calendar
+                'number_of_days': number_of_days if number_of_days is not None else employee._count_leave_days(date_from, date_to),
+                'state': state,
+            }))
+        return valid
+
+    @api.model
+    def _drop_overlaps(self, valid, errors):
+        """Reject rows overlapping another row of the file or an existing leave"""
+        kept = []
+        last_to = {}
+        for line, vals in sorted(valid, key=lambda item: (item[1]['employee_id'], item[1]['request_date_from'])):
+            previous = last_to.get(vals['employee_id'])
+            if previous and vals['request_date_from'] <= previous[1]:
+                errors.append({'line': line, 'error': 'Overlaps line %s of the file' % previous[0]})
+                continue
+            last_to[vals['employee_id']] = (line, vals['request_date_to'])
+            kept.append((line, vals))
+        if not kept:
+            return kept
+
+        # One query for the whole file, served by the daterange GiST index
+        self.env['hr.leave'].flush(['employee_id', 'state', 'active', 'request_date_from', 'request_date_to'])
+        self.env.cr.execute("""
+            SELECT r.line, min(l.id)
+              FROM unnest(%s::int[], %s::int[], %s::date[], %s::date[]) AS r(line, employee_id, date_from, date_to)
+              JOIN hr_leave l ON l.employee_id = r.employee_id
+               AND l.state IN ('confirm', 'validate')
+               AND l.active
+               AND daterange(l.request_date_from, l.request_date_to, '[]') && daterange(r.date_from, r.date_to, '[]')
+          GROUP BY r.line
+        """, (
+            [line for line, _vals in kept],
+            [vals['employee_id'] for _line, vals in kept],
+            [vals['request_date_from'] for _line, vals in kept],
+            [vals['request_date_to'] for _line, vals in kept],
+        ))
+        conflicts = dict(self.env.cr.fetchall())
+        for line, leave_id in conflicts.items():
+            errors.append({'line': line, 'error': 'Overlaps existing leave %s' % leave_id})
+        return [(line, vals) for line, vals in kept if line not in conflicts]
+
+    @api.model
+    def _create_rows(self, Leave, rows):
+        leaves = Leave.create([dict(vals, state='confirm') for _line, vals in rows])
+        # Approve through the workflow so the calendar leaves are created too
+        leaves.browse([
+            leave.id for leave, (_line, vals) in zip(leaves, rows) if vals['state'] == 'validate'
+        ]).action_validate()
+        return leaves
+
+    @api.model
+    def _create_batch(self, Leave, batch, errors):
+        """Create one batch; if it fails, retry row by row to report the failing lines"""
+        try:
+            with self.env.cr.savepoint():
+                return self._create_rows(Leave, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                errors.append({'line': batch[0][0], 'error': str(e)})
+                return Leave.browse()
+
+        created = Leave.browse()
+        for row in batch:
+            try:
+                with self.env.cr.savepoint():
+                    created |= self._create_rows(Leave, [row])
+            except Exception as e:
+                errors.append({'line': row[0], 'error': str(e)})
+        return created
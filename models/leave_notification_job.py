@@ -0,0 +1,124 @@
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Attempts before a job is moved to the dead-letter state
+MAX_ATTEMPTS = 5
+
+# Retry delay doubles after each failed attempt, up to RETRY_MAX_DELAY
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=2)
+
+# Done jobs are kept this long for auditing
+DONE_RETENTION = timedelta(days=30)
+
+
+class LeaveNotificationJob(models.Model):
+    """Outbox of leave notifications, sent by a cron instead of inside the portal request.
+
+    Jobs are inserted in the transaction that creates the leave, so they only
+    become visible once the leave is committed, and the cron is triggered to
+    pick them up right after. Failed jobs are retried with exponential backoff
+    and end up in the ``dead`` state after ``MAX_ATTEMPTS``.
+    """
+    _name = 'hr.leave.notification.job'
+    _description = 'Leave Notification Job'
+    _order = 'id desc'
+
+    leave_id = fields.Many2one('hr.leave', required=True, ondelete='cascade', index=True)
+    job_type = fields.Selection([
+        ('first_approval', 'First Approval Notification'),
+    ], required=True)
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('dead', 'Failed'),
+    ], default='queued', required=True)
+    attempts = fields.Integer(default=0)
+    next_attempt_at = fields.Datetime(default=fields.Datetime.now, required=True)
+    last_error = fields.Text()
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS hr_leave_notification_job_queued_index
+                ON hr_leave_notification_job (next_attempt_at) WHERE state = 'queued'
+        """)
+
+    @api.model
+    def _enqueue(self, leaves, job_type):
+        """Queue ``job_type`` for ``leaves`` and wake the cron up once the transaction commits"""
+        jobs = self.create([{'leave_id': leave.id, 'job_type': job_type} for leave in leaves])
+        self._trigger_cron()
+        return jobs
+
+    @api.model
+    def _trigger_cron(self, at=None):
+        self.env.ref('custom_leave_request.ir_cron_process_leave_notification_jobs').sudo()._trigger(at)
+
+    def _run_first_approval(self):
+        self.leave_id._compute_approvers()
+        self.leave_id._send_first_approval_notification()
+
+    @api.model
+    def _cron_process_jobs(self, limit=100):
+        """Run due jobs, each in its own transaction.
+
+        Rows are locked with ``SKIP LOCKED`` so overlapping cron runs never
+        send the same notification twice.
+        """
+        testing = getattr(threading.current_thread(), 'testing', False)
+        processed = 0
+        while processed < limit:
+            self.env.cr.execute("""
+                SELECT id FROM hr_leave_notification_job
+                 WHERE state = 'queued' AND next_attempt_at <= (now() AT TIME ZONE 'UTC')
+              ORDER BY next_attempt_at, id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                break
+            self.browse(row[0])._process()
+            processed += 1
+            if not testing:
+                self.env.cr.commit()
+            self.invalidate_cache()
+
+        self.search([
+            ('state', '=', 'done'),
+            ('write_date', '<', fields.Datetime.now() - DONE_RETENTION),
+        ]).unlink()
+        if processed:
+            _logger.info("Leave notification jobs: processed %s", processed)
+
+    def _process(self):
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                getattr(self, '_run_%s' % self.job_type)()
+        except Exception as e:
+            attempts = self.attempts + 1
+            if attempts >= MAX_ATTEMPTS:
+                _logger.error("Leave notification job %s failed %s times, giving up: %s", self.id, attempts, e)
+                self.write({'state': 'dead', 'attempts': attempts, 'last_error': str(e)})
+            else:
+                delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+                _logger.warning("Leave notification job %s failed, retrying in %s: %s", self.id, delay, e)
+                self.write({
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'next_attempt_at': fields.Datetime.now() + delay,
+                })
+                self._trigger_cron(self.next_attempt_at)
+            return
+        self.write({'state': 'done', 'attempts': self.attempts + 1, 'last_error': False})
+
+    def action_retry(self):
+        """Put failed jobs back in the queue"""
+        self.write({'state': 'queued', 'attempts': 0, 'next_attempt_at': fields.Datetime.now()})
+        self._trigger_cron()
@@ -0,0 +1,70 @@
+import json
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# How long a submission key replays its original response
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+# Client keys are UUIDs, anything longer is refused
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+
+class LeaveRequestIdempotency(models.Model):
+    """Responses of portal leave submissions keyed by a client-supplied key.
+
+    The key row is inserted in the transaction that creates the leave. A
+    retry of the same submission either waits for that transaction on the
+    unique index and then replays the stored response, or, if the first
+    attempt rolled back, goes through normally.
+    """
+    _name = 'hr.leave.request.idempotency'
+    _description = 'Leave Request Idempotency Key'
+    _log_access = False
+
+    key = fields.Char(required=True)
+    employee_id = fields.Many2one('hr.employee', required=True, ondelete='cascade')
+    response = fields.Text()
+    created_at = fields.Datetime(required=True, default=fields.Datetime.now)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'Idempotency keys must be unique.'),
+    ]
+
+    @api.model
+    def _reserve(self, key, employee):
+        """Claim ``key`` for ``employee``; return the stored response of an earlier attempt, if any"""
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO hr_leave_request_idempotency (key, employee_id, created_at)
+            VALUES (%s, %s, now() AT TIME ZONE 'UTC')
+            ON CONFLICT (key) DO NOTHING
+            RETURNING id
+        """, (key, employee.id))
+        if cr.fetchone():
+            return None
+
+        cr.execute("""
+            SELECT employee_id, response FROM hr_leave_request_idempotency WHERE key = %s
+        """, (key,))
+        employee_id, response = cr.fetchone()
+        if employee_id != employee.id or not response:
+            # Somebody else's key, or a committed attempt without stored response
+            return {'success': False, 'error': 'This request key was already used'}
+        _logger.info("Replaying leave submission %s for employee %s", key, employee.id)
+        return json.loads(response)
+
+    @api.model
+    def _store(self, key, response):
+        self.env.cr.execute(
+            "UPDATE hr_leave_request_idempotency SET response = %s WHERE key = %s",
+            (json.dumps(response), key))
+
+    @api.autovacuum
+    def _gc_expired_keys(self):
+        self.env.cr.execute(
+            "DELETE FROM hr_leave_request_idempotency WHERE created_at < %s",
+            (fields.Datetime.now() - IDEMPOTENCY_TTL,))
@@ -0,0 +1,48 @@
+from odoo import api, models, tools
+
+
+class ResCountry(models.Model):
+    _inherit = 'res.country'
+
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _get_portal_countries(self):
+        """((id, name), ...) of every country in the context language, sorted by name, cached per registry"""
+        countries = self.sudo().search([])
+        return tuple(sorted(((country.id, country.name) for country in countries), key=lambda row: row[1]))
+
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _get_portal_country_map(self):
+        """Country ids by lowercase name (in the context language) and by ISO code"""
+        country_map = {}
+        for country in self.sudo().search([]):
+            country_map[country.name.lower()] = country.id
+            if country.code:
+                country_map[country.code.lower()] = country.id
+        return country_map
+
+    @api.model
+    def _resolve_portal_country(self, value):
+        """Country id for a portal value: an id, or a name or code from older clients; False if unknown"""
+        value = str(value or '').strip()
+        if value.isdigit():
+            return int(value) if int(value) in dict(self._get_portal_countries()) else False
+        return self._get_portal_country_map().get(value.lower(), False)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        countries = super().create(vals_list)
+        self.clear_caches()
+        return countries
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'name' in vals or 'code' in vals:
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
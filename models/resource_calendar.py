@@ -0,0 +1,122 @@
+import base64
+from calendar import isleap
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+from odoo import api, models, tools
+
+
+class ResourceCalendar(models.Model):
+    _inherit = 'resource.calendar'
+
+    @tools.ormcache('self.id', 'year')
+    def _get_working_day_index(self, year):
+        """Working days of ``year`` as ``(days, prefix)``.
+
+        ``days[i]`` is 1 when day ``i`` of the year is a working day of the
+        calendar (a weekday with attendances, not a public holiday) and
+        ``prefix[i]`` counts the working days before day ``i``, so counting the
+        working days of any range is two lookups.
+        """
+        start = date(year, 1, 1)
+        length = 366 if isleap(year) else 365
+        weekdays = {
+            int(attendance.dayofweek)
+            for attendance in self.attendance_ids
+            if not attendance.resource_id and not attendance.display_type
+        }
+        days = bytearray(1 if (start + timedelta(days=i)).weekday() in weekdays else 0 for i in range(length))
+
+        # Public holidays: calendar leaves without resource, of this calendar or of every calendar
+        tz = pytz.timezone(self.tz or 'UTC')
+        holidays = self.env['resource.calendar.leaves'].sudo().search([
+            ('resource_id', '=', False),
+            ('calendar_id', 'in', [self.id, False]),
+            ('date_from', '<', datetime.combine(date(year + 1, 1, 2), time.min)),
+            ('date_to', '>', datetime.combine(date(year - 1, 12, 31), time.min)),
+        ])
+        for holiday in holidays:
+            first = pytz.utc.localize(holiday.date_from).astimezone(tz).date()
+            last = pytz.utc.localize(holiday.date_to).astimezone(tz).date()
+            for offset in range(max((first - start).days, 0), min((last - start).days + 1, length)):
+                days[offset] = 0
+
+        prefix = [0]
+        for working in days:
+            prefix.append(prefix[-1] + working)
+        return bytes(days), tuple(prefix)
+
+    def _count_working_days(self, date_from, date_to):
+        """Working days between ``date_from`` and ``date_to`` included, in O(1) per year spanned"""
+        self.ensure_one()
+        total = 0
+        for year in range(date_from.year, date_to.year + 1):
+            _days, prefix = self._get_working_day_index(year)
+            first = (max(date_from, date(year, 1, 1)) - date(year, 1, 1)).days
+            last = (min(date_to, date(year, 12, 31)) - date(year, 1, 1)).days
+            total += prefix[last + 1] - prefix[first]
+        return total
+
+    def _get_working_day_bitmap(self, year):
+        """Working days of ``year`` packed one bit per day (day ``i`` is bit ``i % 8`` of byte ``i // 8``), base64"""
+        days, _prefix = self._get_working_day_index(year)
+        packed = bytearray((len(days) + 7) // 8)
+        for offset, working in enumerate(days):
+            if working:
+                packed[offset >> 3] |= 1 << (offset & 7)
+        return base64.b64encode(bytes(packed)).decode()
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'attendance_ids', 'leave_ids', 'global_leave_ids', 'tz'}.intersection(vals):
+            self.clear_caches()
+        return res
+
+
+class ResourceCalendarAttendance(models.Model):
+    _inherit = 'resource.calendar.attendance'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        attendances = super().create(vals_list)
+        self.env['resource.calendar'].clear_caches()
+        return attendances
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['resource.calendar'].clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['resource.calendar'].clear_caches()
+        return res
+
+
+class ResourceCalendarLeaves(models.Model):
+    _inherit = 'resource.calendar.leaves'
+
+    # Only public holidays (no resource) change working days; approved leaves
+    # create resource-specific calendar leaves and must not flush the caches
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leaves = super().create(vals_list)
+        if any(not leave.resource_id for leave in leaves):
+            self.env['resource.calendar'].clear_caches()
+        return leaves
+
+    def write(self, vals):
+        public = any(not leave.resource_id for leave in self)
+        res = super().write(vals)
+        if public or any(not leave.resource_id for leave in self):
+            self.env['resource.calendar'].clear_caches()
+        return res
+
+    def unlink(self):
+        public = any(not leave.resource_id for leave in self)
+        res = super().unlink()
+        if public:
+            self.env['resource.calendar'].clear_caches()
+        return res
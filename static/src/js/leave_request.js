@@ -3,12 +3,28 @@
  * Modified to use only session employee (no employee dropdown)
  */
 
+// Same limits as the server (models/leave_attachment_upload.py)
+const ATTACHMENT_MAX_SIZE = 25 * 1024 * 1024;
+const ATTACHMENT_EXTENSIONS = ['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'];
+
+// Files above the threshold are sent in resumable chunks before the form
+const CHUNKED_UPLOAD_THRESHOLD = 2 * 1024 * 1024;
+const UPLOAD_CHUNK_SIZE = 512 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+function newUuid() {
+    return window.crypto && window.crypto.randomUUID
+        ? window.crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
 class LeaveRequestForm {
     constructor() {
         const container = document.getElementById('leave-request-app');
         this.employeeNumber = container.getAttribute('data-employee-number');
         this.employeeName = container.getAttribute('data-employee-name');
         this.timeOffTypes = [];
+        this.bootstrap = this.parseBootstrap(container.getAttribute('data-bootstrap'));
         this.formData = {
             employee_number: this.employeeNumber,
             holiday_status_id: 0,
@@ -27,12 +43,32 @@ class LeaveRequestForm {
             console.error("Missing employee number.");
             return;
         }
-        await this.loadTimeOffTypes();
-        await this.loadLeaveBalance();
+        if (this.bootstrap) {
+            // Types and balances were rendered into the page, no extra round trips
+            this.timeOffTypes = this.bootstrap.time_off_types || [];
+            this.applyLeaveBalance(this.bootstrap.leave_balance);
+            this.applyTakenDays(this.bootstrap.taken_days);
+            this.applyWorkingCalendar(this.bootstrap.working_calendar);
+        } else {
+            await this.loadTimeOffTypes();
+            await this.loadLeaveBalance();
+            await this.loadTakenDays();
+            await this.loadWorkingCalendar();
+        }
         this.renderForm();
         this.setupEventListeners();
     }
 
+    parseBootstrap(raw) {
+        if (!raw) return null;
+        try {
+            return JSON.parse(raw);
+        } catch (error) {
+            console.warn("⚠️ Invalid bootstrap data, falling back to API calls");
+            return null;
+        }
+    }
+
    async loadTimeOffTypes() {
     try {
         const typesResponse = await fetch('/api/time-off-types', {
@@ -55,8 +91,10 @@ class LeaveRequestForm {
         });
 
         const response = await res.json();
-        const data = response.result;
+        this.applyLeaveBalance(response.result);
+    }
 
+    applyLeaveBalance(data) {
         if (data && data.success) {
             const today = new Date();
             const cutoff = new Date(today.getFullYear(), 5, 30); // June 30
@@ -84,6 +122,112 @@ class LeaveRequestForm {
         }
     }
 
+    async loadTakenDays() {
+        try {
+            const res = await fetch('/api/leave/taken-days', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ employee_number: this.employeeNumber })
+            });
+            const response = await res.json();
+            if (response.result && response.result.success) {
+                this.applyTakenDays(response.result);
+            }
+        } catch (error) {
+            console.warn("⚠️ Failed to load taken days, dates will be checked by the server");
+        }
+    }
+
+    applyTakenDays(data) {
+        // Expand the run-length encoding into one code per day of the window
+        if (!data || !data.start) return;
+        const start = Date.parse(data.start);
+        const length = Math.round((Date.parse(data.end) - start) / 86400000) + 1;
+        const days = new Uint8Array(length);
+        (data.runs || []).forEach(([offset, count, code]) => days.fill(code, offset, offset + count));
+        this.takenDays = { start, days, codes: data.codes };
+    }
+
+    async loadWorkingCalendar() {
+        try {
+            const res = await fetch('/api/leave/working-calendar', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ params: {} })
+            });
+            const response = await res.json();
+            if (response.result && response.result.success) {
+                this.applyWorkingCalendar(response.result);
+            }
+        } catch (error) {
+            console.warn("⚠️ Failed to load the working calendar, durations are previewed in calendar days");
+        }
+    }
+
+    applyWorkingCalendar(data) {
+        // Per year: prefix[i] = working days before day i, from the server's bitmap (bit i % 8 of byte i / 8)
+        this.workingCalendar = {};
+        Object.entries((data && data.years) || {}).forEach(([year, bitmap]) => {
+            const bytes = Uint8Array.from(atob(bitmap), c => c.charCodeAt(0));
+            const length = (Date.UTC(+year + 1, 0, 1) - Date.UTC(+year, 0, 1)) / 86400000;
+            const prefix = new Uint16Array(length + 1);
+            for (let i = 0; i < length; i++) {
+                prefix[i + 1] = prefix[i] + ((bytes[i >> 3] >> (i & 7)) & 1);
+            }
+            this.workingCalendar[year] = prefix;
+        });
+    }
+
+    countWorkingDays(fromDate, toDate) {
+        // Same count as the server; null when a year of the range is not loaded
+        if (!this.workingCalendar) return null;
+        const [fromYear, toYear] = [+fromDate.slice(0, 4), +toDate.slice(0, 4)];
+        const dayOfYear = (dateStr, year) => (Date.parse(dateStr) - Date.UTC(year, 0, 1)) / 86400000;
+        let total = 0;
+        for (let year = fromYear; year <= toYear; year++) {
+            const prefix = this.workingCalendar[year];
+            if (!prefix) return null;
+            const first = year === fromYear ? dayOfYear(fromDate, year) : 0;
+            const last = year === toYear ? dayOfYear(toDate, year) : prefix.length - 2;
+            total += prefix[last + 1] - prefix[first];
+        }
+        return total;
+    }
+
+    takenDayCode(dateStr) {
+        // undefined outside the loaded window
+        const offset = Math.round((Date.parse(dateStr) - this.takenDays.start) / 86400000);
+        return this.takenDays.days[offset];
+    }
+
+    checkTakenDaysLocally(fromDate, toDate) {
+        // Same rules as /api/check/leave/valid; null when the server has to decide
+        if (!this.takenDays) return null;
+        const { validate } = this.takenDays.codes;
+        const day = 86400000;
+        const first = Date.parse(fromDate);
+        const last = Date.parse(toDate);
+        const isoDate = time => new Date(time).toISOString().split('T')[0];
+
+        const before = this.takenDayCode(isoDate(first - day));
+        const after = this.takenDayCode(isoDate(last + day));
+        if (before === undefined || after === undefined) return null;
+
+        // Only approved leaves block a request, overlapping a pending one is allowed
+        for (let time = first; time <= last; time += day) {
+            if (this.takenDayCode(isoDate(time)) === validate) {
+                return { success: false, error: `Date ${isoDate(time)} is already taken by another leave request` };
+            }
+        }
+        if (before === validate) {
+            return { success: false, error: 'Casual Leave cannot be combined with any other form of leave before the start date.' };
+        }
+        if (after === validate) {
+            return { success: false, error: 'Casual Leave cannot be combined with any other form of leave after the end date.' };
+        }
+        return { success: true };
+    }
+
     isCasualLeaveSelected() {
         const casualLeaveType = this.timeOffTypes.find(type => type.id === this.formData.holiday_status_id);
         if (!casualLeaveType) return false;
@@ -128,9 +272,10 @@ class LeaveRequestForm {
         return;
     }
 
-    // --- Overlap check (only once) ---
+    // --- Overlap check: local when the dates are in the loaded window, the server confirms at submit ---
     try {
-        const response = await this.checkCasualLeaveOverlap(fromDate, toDate);
+        const response = this.checkTakenDaysLocally(fromDate, toDate)
+            || await this.checkCasualLeaveOverlap(fromDate, toDate);
         if (!response.success) {
             this.showNotification(response.error || "Overlap check failed", 'error');
             this.hasBlockingError = true;
@@ -590,7 +735,11 @@ class LeaveRequestForm {
             }
 
 
-            let totalDays = Math.floor((to - from) / (1000 * 60 * 60 * 24)) + 1;
+            // Working days of the employee's calendar, like the server; calendar days as a fallback
+            let totalDays = this.countWorkingDays(fromDateVal, toDateVal);
+            if (totalDays === null) {
+                totalDays = Math.floor((to - from) / (1000 * 60 * 60 * 24)) + 1;
+            }
 
             if (isHalfDay) {
                 totalDays = totalDays / 2;
@@ -614,6 +763,9 @@ class LeaveRequestForm {
         const form = e.target;
         const formData = new FormData(form);
         formData.append('employee_number', this.employeeNumber);
+        // Same key for every retry of this submission, the server replays the first response
+        this.submissionKey = this.submissionKey || newUuid();
+        formData.append('idempotency_key', this.submissionKey);
         formData.append('number_of_days', this.formData.number_of_days);
 
         // --- Required fields validation ---
@@ -668,22 +820,52 @@ class LeaveRequestForm {
             return;
         }
 
+        // --- Attachment type/size check before uploading anything ---
+        const attachment = formData.get('attachment');
+        if (attachment && attachment.size) {
+            const extension = attachment.name.split('.').pop().toLowerCase();
+            if (!ATTACHMENT_EXTENSIONS.includes(extension)) {
+                this.showNotification("Only PDF, JPG, PNG and Word files can be attached.", 'error');
+                return;
+            }
+            if (attachment.size > ATTACHMENT_MAX_SIZE) {
+                this.showNotification(`Attachments cannot be larger than ${ATTACHMENT_MAX_SIZE / (1024 * 1024)} MB.`, 'error');
+                return;
+            }
+        }
+
         this.setLoading(true);
 
         try {
+            // --- Known or large files go first through the resumable chunked upload ---
+            if (attachment && attachment.size) {
+                const uploadKey = await this.uploadAttachmentInChunks(attachment);
+                if (uploadKey) {
+                    formData.delete('attachment');
+                    formData.append('attachment_upload_key', uploadKey);
+                }
+            }
+
+            // Overlaps are checked locally on date pick; /api/leave-request enforces them
             const response = await fetch('/api/leave-request', {
                 method: 'POST',
                 body: formData
             });
 
             if (!response.ok) {
-                throw new Error(`Server error: ${response.status}`);
+                // Not an answer about the request itself: submitting again is safe, the
+                // same idempotency key replays the result if the leave was created
+                this.showNotification(`Server error (${response.status}). Please try again.`, 'error');
+                return;
             }
 
             const rpcResponse = await response.json();
             const result = rpcResponse?.result || rpcResponse; // support both shapes
 
             if (result?.success) {
+                if (this.attachmentStorageKey) {
+                    window.localStorage.removeItem(this.attachmentStorageKey);
+                }
                 this.showNotification(result.message || 'Leave request submitted successfully!', 'success');
 
                 setTimeout(() => {
@@ -704,15 +886,95 @@ class LeaveRequestForm {
                 this.hasBlockingError = true;
             }
         } catch (error) {
+            // Network error or timeout: leave the form submittable so the retry (same
+            // idempotency key) gets the stored response if the leave was created
             console.error('Error submitting request:', error);
-            this.showNotification(error.message || 'Network error. Please try again.', 'error');
-            this.hasBlockingError = true;
+            this.showNotification('Network error. Please try again.', 'error');
         } finally {
             this.setLoading(false);
         }
     }
 
-   
+    attachmentUploadKey(file) {
+        // Same key for the same file, so a retry or a page reload resumes the upload
+        const fileId = `${file.name}:${file.size}:${file.lastModified}`;
+        const storageKey = `leave_upload:${this.employeeNumber}:${fileId}`;
+        let uploadKey = window.localStorage.getItem(storageKey);
+        if (!uploadKey) {
+            uploadKey = newUuid();
+            window.localStorage.setItem(storageKey, uploadKey);
+        }
+        return { uploadKey, storageKey };
+    }
+
+    async fileChecksum(file) {
+        // SHA-1 like ir.attachment.checksum; WebCrypto is only available over HTTPS
+        if (!window.crypto || !window.crypto.subtle) return null;
+        try {
+            const digest = await window.crypto.subtle.digest('SHA-1', await file.arrayBuffer());
+            return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+        } catch (error) {
+            return null;
+        }
+    }
+
+    async uploadAttachmentInChunks(file) {
+        // Returns the upload key, or null when a small new file should simply be posted with the form
+        const checksum = await this.fileChecksum(file);
+        if (!checksum && file.size <= CHUNKED_UPLOAD_THRESHOLD) return null;
+        const { uploadKey, storageKey } = this.attachmentUploadKey(file);
+        let failures = 0;
+
+        while (true) {
+            try {
+                // Ask where to resume, then send the remaining chunks
+                const res = await fetch('/api/leave-attachment/upload/start', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        params: { upload_key: uploadKey, filename: file.name, size: file.size, checksum }
+                    })
+                });
+                const status = (await res.json()).result || {};
+                if (!status.success) {
+                    throw Object.assign(new Error(status.error || 'Upload failed'), { fatal: true });
+                }
+                if (!status.done && file.size <= CHUNKED_UPLOAD_THRESHOLD) {
+                    // Not seen before and small enough for the form itself
+                    return null;
+                }
+
+                let offset = status.received_size;
+                let done = status.done;
+                while (!done) {
+                    const body = new FormData();
+                    body.append('upload_key', uploadKey);
+                    body.append('offset', offset);
+                    body.append('chunk', file.slice(offset, offset + UPLOAD_CHUNK_SIZE), file.name);
+                    const chunkRes = await fetch('/api/leave-attachment/upload/chunk', { method: 'POST', body });
+                    const chunkResult = await chunkRes.json();
+                    if (!chunkResult.success) {
+                        throw Object.assign(new Error(chunkResult.error || 'Upload failed'), { fatal: true });
+                    }
+                    offset = chunkResult.received_size;
+                    done = chunkResult.done;
+                    failures = 0;
+                }
+
+                // Kept until the request is submitted, a failed submit reuses the upload
+                this.attachmentStorageKey = storageKey;
+                return uploadKey;
+            } catch (error) {
+                // Network errors are retried with backoff, server refusals are not
+                failures += 1;
+                if (error.fatal || failures > UPLOAD_MAX_RETRIES) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** (failures - 1)));
+            }
+        }
+    }
+
     setLoading(loading) {
         const submitBtn = document.getElementById('submitBtn');
         if (submitBtn) {
@@ -5,14 +5,57 @@
 // Global variables
 let currentEditSection = null;
 let originalFormData = {};
+let referenceData = null;
+
+// Options used until the reference data is loaded
+const DEFAULT_SELECTIONS = {
+    gender: [['male', 'Male'], ['female', 'Female'], ['other', 'Other']],
+    marital: [['single', 'Single'], ['married', 'Married'], ['divorced', 'Divorced'], ['widowed', 'Widowed']]
+};
 
 // Initialize when DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
     initializeProfile();
     setupEventListeners();
     loadRecentActivity();
+    loadReferenceData();
 });
 
+/**
+ * Load countries and selection values from the versioned, browser-cached reference data URL
+ */
+function loadReferenceData() {
+    const container = document.querySelector('[data-reference-url]');
+    const url = container && container.getAttribute('data-reference-url');
+    if (!url) return;
+    fetch(url, {credentials: 'same-origin'})
+        .then(response => response.ok ? response.json() : null)
+        .then(data => { referenceData = data; })
+        .catch(error => console.error('Error loading reference data:', error));
+}
+
+/**
+ * Render <option> elements for [value, label] pairs
+ */
+function renderOptions(options, selected, placeholder) {
+    const escape = text => String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/"/g, '&quot;');
+    return `<option value="">${placeholder}</option>` + options.map(([value, label]) =>
+        `<option value="${escape(value)}" ${String(value) === String(selected) ? 'selected' : ''}>${escape(label)}</option>`
+    ).join('');
+}
+
+/**
+ * Nationality options: every country once the reference data is loaded, else the current one
+ */
+function getCountryOptions() {
+    if (referenceData && referenceData.countries) {
+        return referenceData.countries;
+    }
+    const element = document.querySelector('[data-field="country_id.name"]');
+    const countryId = element && element.getAttribute('data-value');
+    return countryId ? [[countryId, getEmployeeData('country_id.name')]] : [];
+}
+
 /**
  * Initialize profile page functionality
  */
@@ -114,6 +157,9 @@ function editSection(section) {
  */
 function setupPersonalEditForm(modalTitle, editFields) {
     modalTitle.textContent = 'Edit Personal Information';
+    const selections = (referenceData && referenceData.selections) || DEFAULT_SELECTIONS;
+    const countryElement = document.querySelector('[data-field="country_id.name"]');
+    const countryId = (countryElement && countryElement.getAttribute('data-value')) || '';
     editFields.innerHTML = `
         <div class="agb-form-group">
             <label class="agb-label">
@@ -129,10 +175,7 @@ function setupPersonalEditForm(modalTitle, editFields) {
                 Gender
             </label>
             <select name="gender" class="agb-input">
-                <option value="">Select Gender</option>
-                <option value="male" ${getEmployeeData('gender') === 'male' ? 'selected' : ''}>Male</option>
-                <option value="female" ${getEmployeeData('gender') === 'female' ? 'selected' : ''}>Female</option>
-                <option value="other" ${getEmployeeData('gender') === 'other' ? 'selected' : ''}>Other</option>
+                ${renderOptions(selections.gender, getEmployeeData('gender'), 'Select Gender')}
             </select>
         </div>
         <div class="agb-form-group">
@@ -157,8 +200,9 @@ function setupPersonalEditForm(modalTitle, editFields) {
                 <i class="fa fa-flag"></i>
                 Nationality
             </label>
-            <input type="text" name="country_id" class="agb-input" 
-                value="${getEmployeeData('country_id.name')}" placeholder="e.g., Myanmar"/>
+            <select name="country_id" class="agb-input">
+                ${renderOptions(getCountryOptions(), countryId, 'Select Nationality')}
+            </select>
         </div>
 
         <div class="agb-form-group">
@@ -167,11 +211,7 @@ function setupPersonalEditForm(modalTitle, editFields) {
                 Marital Status
             </label>
             <select name="marital" class="agb-input">
-                <option value="">Select Status</option>
-                <option value="single" ${getEmployeeData('marital') === 'single' ? 'selected' : ''}>Single</option>
-                <option value="married" ${getEmployeeData('marital') === 'married' ? 'selected' : ''}>Married</option>
-                <option value="divorced" ${getEmployeeData('marital') === 'divorced' ? 'selected' : ''}>Divorced</option>
-                <option value="widowed" ${getEmployeeData('marital') === 'widowed' ? 'selected' : ''}>Widowed</option>
+                ${renderOptions(selections.marital, getEmployeeData('marital'), 'Select Status')}
             </select>
         </div>
         <div class="agb-form-group">
@@ -480,6 +520,13 @@ function hideLoadingState(form) {
 function updatePageData(updatedData) {
     console.log('Updating page data:', updatedData);
     for (const [field, value] of Object.entries(updatedData)) {
+        if (field === 'country_id') {
+            // The nationality is shown by name and keeps its id for the edit form
+            document.querySelectorAll('[data-field="country_id.name"]').forEach(element => {
+                element.setAttribute('data-value', value || '');
+            });
+            continue;
+        }
         const elements = document.querySelectorAll(`[data-field="${field}"]`);
         elements.forEach(element => {
             if (element.tagName === 'INPUT' || element.tagName === 'TEXTAREA') {